@@ -0,0 +1,116 @@
+import heapq
+from array import array
+
+#
+# Process-level copy of States and Population for the charts, with each
+# population year held in a flat array of 64-bit ints indexed by region
+# position, plus any results derived from the database kept with
+# remember(), like the metrics table. Each table is read up front with one
+# query, so repeated chart queries become array lookups instead of joins
+# that build a tuple per row. The top-n case charts don't need it, they
+# read the StateSummary table the ingest scripts keep up to date.
+#
+# A cache is tied to one connection and checked on every use against
+# PRAGMA data_version, which moves when another connection commits, and
+# the connection's total_changes, which moves when this one writes. If
+# either differs from when it was loaded, it's loaded again, along with
+# anything kept with remember().
+#
+
+# stands in for "no row" in the int arrays
+MISSING = -2 ** 63
+
+caches = {}
+
+
+class AnalyticCache:
+    '''The cached tables of one connection. states, names and state_ids are per-region lists in state_id order and
+    populations maps a year to an array of one population per region.'''
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.load()
+
+    def version(self):
+        return self.conn.execute('PRAGMA data_version').fetchone()[0], self.conn.total_changes
+
+    def load(self):
+        '''Reads the tables in one read transaction and records the version they were read at.'''
+        conn = self.conn
+        #without a transaction each SELECT could see a different commit from another connection
+        started = not conn.in_transaction
+        if started:
+            conn.execute('BEGIN')
+        try:
+            self.read_tables()
+        finally:
+            if started:
+                conn.commit()
+
+    def read_tables(self):
+        conn = self.conn
+        self.loaded_version = self.version()
+        self.remembered = {}
+        tables = set(row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'"))
+
+        self.state_ids = []
+        self.states = []
+        self.names = []
+        if 'States' in tables:
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(States)')]
+            name = 'name' if 'name' in columns else 'NULL'
+            for state_id, state, full_name in conn.execute(f'SELECT state_id, state, {name} FROM States ORDER BY state_id'):
+                self.state_ids.append(state_id)
+                self.states.append(state)
+                self.names.append(full_name)
+        self.state_index = {state: i for i, state in enumerate(self.states)}
+        region_by_id = {state_id: i for i, state_id in enumerate(self.state_ids)}
+
+        self.populations = {}
+        if 'Population' in tables and 'year' in [row[1] for row in conn.execute('PRAGMA table_info(Population)')]:
+            for state_id, year, population in conn.execute('SELECT state_id, year, population FROM Population'):
+                region = region_by_id.get(state_id)
+                if region is None or population is None:
+                    continue
+                if year not in self.populations:
+                    self.populations[year] = array('q', [MISSING]) * len(self.states)
+                self.populations[year][region] = int(population)
+
+    def is_current(self):
+        return self.version() == self.loaded_version
+
+    def remember(self, key, compute):
+        '''Returns the value stored under key, calling compute() to work it out the first time. For results derived
+        from the database, like the metrics table, that should be recomputed whenever the cache is reloaded.'''
+        if key not in self.remembered:
+            self.remembered[key] = compute()
+        return self.remembered[key]
+
+    def population(self, year):
+        '''Returns an array with every region's population in the given year, MISSING where there's none.'''
+        return self.populations.get(int(year), array('q', [MISSING]) * len(self.states))
+
+    def top(self, values, n=10):
+        '''Takes in a sequence with one value per region (an array from population, or a list that can hold None).
+        Returns the (state, value) pairs of the n regions with the highest values, biggest first, leaving out regions
+        without one.'''
+        found = (i for i in range(len(values)) if values[i] is not None and values[i] != MISSING)
+        return [(self.states[i], values[i]) for i in heapq.nlargest(n, found, key=values.__getitem__)]
+
+
+def get_cache(cur):
+    '''This function takes in a cursor. Returns the AnalyticCache of its connection, loading it on first use and
+    again whenever the database changed since it was loaded.'''
+    conn = cur.connection
+    cache = caches.get(id(conn))
+    #the cache holds on to its connection, so a matching id is always the same connection
+    if cache is None or cache.conn is not conn:
+        cache = caches[id(conn)] = AnalyticCache(conn)
+    elif not cache.is_current():
+        cache.load()
+    return cache
+
+
+def clear_caches():
+    '''Drops every cached copy, e.g. before closing the connections. Returns nothing.'''
+    caches.clear()
@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import covid_data as cd
+import population_data as pdm
+import viz
+from analytic_cache import get_cache
+from population_snapshots import POP_UPSERT
+from queries import ensure_indexes
+from states import STATES
+
+#
+# The population and comparison chart data queried from SQL on every call,
+# like before the analytic cache, against the same functions served from
+# it. The cache load is timed on its own; after that each call is array
+# lookups until the database changes.
+# Run with: python benchmarks/bench_cache.py [regions] [dates] [calls]
+#
+
+START, END = viz.START_DATE, viz.END_DATE
+
+
+def build_db(regions, dates):
+    conn = sqlite3.connect(':memory:')
+    cur = conn.cursor()
+    cd.state_table(cur, conn, STATES + [(f'c{i:05d}', f'County {i}', f'{i:05d}') for i in range(regions - len(STATES))])
+    cd.date_table(cur, conn)
+    cd.create_covid_tables(cur, conn)
+    pdm.create_population_table(cur, conn)
+    ensure_indexes(cur, conn)
+    extra = [str(20200101 + i) for i in range(dates - 2)]
+    cur.executemany('INSERT INTO Dates (date) VALUES (?)', [(date,) for date in extra])
+    ids = cd.date_ids(cur)
+    for d, date in enumerate([START, END] + extra):
+        cur.executemany(cd.COVID_INSERT, [(s, ids[int(date)], s * 7 + d) for s in range(1, regions + 1)])
+    cur.executemany(POP_UPSERT, [(s, 2020, s * 1000 + 7) for s in range(1, regions + 1)])
+    conn.commit()
+    return conn, cur
+
+
+def sql_pop_chart(cur):
+    cur.execute('SELECT COALESCE(States.name, States.state), Population.population FROM Population JOIN States ON Population.state_id = States.state_id '
+                'WHERE Population.year = 2020 ORDER BY Population.population DESC')
+    return cur.fetchall()
+
+
+def sql_comparison_chart(cur):
+    cur.execute('SELECT States.state, CovidData.number_of_cases * 1.0 / Population.population FROM Dates JOIN CovidData ON CovidData.date_id = Dates.date_id '
+                'JOIN States ON CovidData.state_id = States.state_id JOIN Population ON Population.state_id = CovidData.state_id AND Population.year = 2020 '
+                'WHERE Dates.date = ? ORDER BY CovidData.number_of_cases DESC LIMIT 10', (START,))
+    return cur.fetchall()
+
+
+PAIRS = [
+    ('pop_chart', sql_pop_chart, viz.pop_chart_data),
+    ('comparison_chart', sql_comparison_chart, viz.comparison_chart_data),
+]
+
+
+def timed(func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return time.perf_counter() - start
+
+
+def main(regions=500, dates=400, calls=20):
+    regions, dates, calls = int(regions), int(dates), int(calls)
+    conn, cur = build_db(regions, dates)
+    print(f"{regions} regions x {dates} dates, {calls} calls each")
+
+    start = time.perf_counter()
+    get_cache(cur)
+    print(f"  {'cache load':<24} {(time.perf_counter() - start) * 1000:10.1f} ms")
+    print(f"  {'':<24} {'sql':>10} {'cached':>10}")
+    for name, sql, cached in PAIRS:
+        print(f"  {name:<24} {timed(lambda: sql(cur), calls) * 1000:8.1f}ms {timed(lambda: cached(cur), calls) * 1000:8.1f}ms")
+
+    #a write on the connection makes the next call reload
+    cur.execute('UPDATE Population SET population = population + 1 WHERE id = 1')
+    conn.commit()
+    print(f"  {'call after a write':<24} {timed(lambda: viz.pop_chart_data(cur), 1) * 1000:8.1f}ms (reload)")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
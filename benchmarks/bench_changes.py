@@ -0,0 +1,74 @@
+import datetime
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from change_engine import compute_changes
+from states import STATE_NAMES
+
+#
+# Day-over-day change as the number of dates (and regions) grows, comparing
+# the old rescan-every-row-per-state loop with compute_changes.
+# Run with: python benchmarks/bench_changes.py
+#
+
+
+def build_db(dates, states=50):
+    '''Returns an in-memory database with States, Dates, CovidData and Population filled in for the given
+    number of dates and states. States past the first 50 get made up abbreviations and no population.'''
+    abbreviations = list(STATE_NAMES) + [f'r{i}' for i in range(states - 50)]
+    conn = sqlite3.connect(':memory:')
+    cur = conn.cursor()
+    cur.execute('CREATE TABLE States ("state_id" INTEGER PRIMARY KEY, "state" TEXT)')
+    cur.execute('CREATE TABLE Dates ("date_id" INTEGER PRIMARY KEY, "date" TEXT)')
+    cur.execute('CREATE TABLE CovidData ("id" INTEGER PRIMARY KEY, "state_id" NUMBER, "date_id" NUMBER, "number_of_cases" NUMBER)')
+    cur.execute('CREATE TABLE Population ("id" INTEGER PRIMARY KEY, "state_id" INTEGER, "year" INTEGER, "population" INTEGER)')
+    cur.executemany('INSERT INTO States (state) VALUES (?)', [[state] for state in abbreviations[:states]])
+    cur.executemany('INSERT INTO Population (state_id, year, population) VALUES (?, ?, ?)',
+                    [(i + 1, 2020, (i + 1) * 100000) for i in range(min(states, len(STATE_NAMES)))])
+    first = datetime.date(2020, 3, 1)
+    cur.executemany('INSERT INTO Dates (date) VALUES (?)',
+                    [[(first + datetime.timedelta(days=i)).strftime('%Y%m%d')] for i in range(dates)])
+    cur.executemany('INSERT INTO CovidData (state_id, date_id, number_of_cases) VALUES (?, ?, ?)',
+                    [(s, d, 1000 * s + d * d) for d in range(1, dates + 1) for s in range(1, states + 1)])
+    conn.commit()
+    return conn, cur
+
+
+def legacy(cur):
+    cur.execute('SELECT States.state, Dates.date, CovidData.number_of_cases FROM CovidData JOIN States JOIN Dates ON CovidData.state_id = States.state_id and CovidData.date_id = Dates.date_id ORDER BY Dates.date')
+    cases = cur.fetchall()
+    cur.execute('SELECT state FROM States')
+    results = []
+    for (state,) in cur.fetchall():
+        cases_list = []
+        for row in cases:
+            if row[0] == state:
+                cases_list.append(row[2])
+        for before, after in zip(cases_list, cases_list[1:]):
+            results.append((after - before) / before * 100)
+    return results
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main():
+    print(f"{'states':>6} {'dates':>6} {'rows':>8} {'legacy loop':>12} {'engine':>10}")
+    for states, dates in [(50, 2), (50, 10), (50, 50), (50, 100), (50, 200), (50, 400), (200, 400), (500, 400)]:
+        conn, cur = build_db(dates, states)
+        legacy_time, old = timed(lambda: legacy(cur))
+        engine_time, new = timed(lambda: compute_changes(cur))
+        assert len(old) == len(new)
+        print(f"{states:>6} {dates:>6} {dates * states:>8} {legacy_time * 1000:>10.1f}ms {engine_time * 1000:>8.1f}ms")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import viz
+from analytic_cache import clear_caches
+from queries import cases_between, cases_for_state, ensure_indexes
+from state_summary import create_summary_tables, refresh_summary, top_states
+
+#
+# Chart data preparation on a large synthetic database of daily series: the
+# old way of fetching every row into lists and sorting them, against the
+# StateSummary top-n and LTTB-downsampled series viz.py uses now. Peak Python
+# memory for the new versions should stay flat as the series get longer.
+# Run with: python benchmarks/bench_chart_prep.py [regions] [dates...]
+#
+
+FIRST_DAY = datetime.date(2020, 1, 22)
+
+
+def build_db(path, regions, dates):
+    conn = sqlite3.connect(path)
+    cur = conn.cursor()
+    cur.execute('PRAGMA journal_mode = WAL')
+    cur.execute('PRAGMA synchronous = OFF')
+    cur.execute('CREATE TABLE States ("state_id" INTEGER PRIMARY KEY, "state" TEXT, "name" TEXT, "fips" TEXT)')
+    cur.execute('CREATE TABLE Dates ("date_id" INTEGER PRIMARY KEY, "date" TEXT)')
+    cur.execute('CREATE TABLE CovidData ("id" INTEGER PRIMARY KEY, "state_id" NUMBER, "date_id" NUMBER, "number_of_cases" NUMBER)')
+    cur.executemany('INSERT INTO States (state, name) VALUES (?, ?)', [(f'r{i}', f'Region {i}') for i in range(regions)])
+    cur.executemany('INSERT INTO Dates (date) VALUES (?)', [((FIRST_DAY + datetime.timedelta(days=d)).strftime('%Y%m%d'),) for d in range(dates)])
+    for d in range(1, dates + 1):
+        cur.executemany('INSERT INTO CovidData (state_id, date_id, number_of_cases) VALUES (?, ?, ?)',
+                        [(s, d, s * d + (d * 7919 + s) % 1000) for s in range(1, regions + 1)])
+    conn.commit()
+    ensure_indexes(cur, conn)
+    create_summary_tables(cur, conn)
+    refresh_summary(cur, conn, FIRST_DAY.strftime('%Y%m%d'), last_day(dates))
+    return conn, cur
+
+
+def last_day(dates):
+    return (FIRST_DAY + datetime.timedelta(days=dates - 1)).strftime('%Y%m%d')
+
+
+def old_top_ten(cur, date):
+    rows = cases_between(cur, date, date)
+    return sorted(rows, key=lambda row: row[2], reverse=True)[:10]
+
+
+def old_series(cur, states):
+    return [cases_for_state(cur, state) for state in states]
+
+
+def measure(func):
+    clear_caches()
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(regions=200, *dates):
+    regions = int(regions)
+    dates = [int(d) for d in dates] or [500, 2000]
+    print(f"{'':>14} {'top 10, rows':>26} {'top 10, summary':>26} {'5 series, rows':>26} {'5 series, lttb':>26}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in dates:
+            conn, cur = build_db(os.path.join(tmp, f'bench{count}.db'), regions, count)
+            last = last_day(count)
+            states = [row[0] for row in old_top_ten(cur, last)[:5]]
+            results = [
+                measure(lambda: old_top_ten(cur, last)),
+                measure(lambda: top_states(cur, 'latest_cases', 10)),
+                measure(lambda: old_series(cur, states)),
+                measure(lambda: viz.case_series_data(cur)),
+            ]
+            cells = ' '.join(f"{seconds * 1000:9.1f} ms {peak / 1e6:8.2f} MB" for seconds, peak in results)
+            print(f"{regions * count:>10} rows {cells}")
+            conn.close()
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,57 @@
+import csv
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_queries import build_db
+from export import EXPORTS, export, read_npy_header
+
+#
+# Exports the full cases time series of a synthetic database three ways:
+# fetchall() and one csv row at a time like the old write_to_file, and the
+# chunked export to .csv and .npy. Reports time, peak Python memory and file size.
+# Run with: python benchmarks/bench_export.py [regions] [dates]
+#
+
+
+def fetchall_csv(cur, path):
+    cur.execute(EXPORTS['cases'])
+    rows = cur.fetchall()
+    with open(path, 'w', newline='') as f:
+        write = csv.writer(f, delimiter=',')
+        write.writerow(('state', 'date', 'cases'))
+        for row in rows:
+            write.writerow(row)
+    return len(rows)
+
+
+def measure(name, func, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = func(path)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  {name:<24} {elapsed:7.2f} s  peak {peak / 1e6:8.1f} MB  file {os.path.getsize(path) / 1e6:8.1f} MB  {count} rows")
+
+
+def main(regions=500, dates=400):
+    regions, dates = int(regions), int(dates)
+    with tempfile.TemporaryDirectory() as tmp:
+        conn, cur = build_db(os.path.join(tmp, 'bench.db'), regions, dates)
+        print(f"{regions} regions x {dates} dates = {regions * dates} rows")
+
+        measure("fetchall + writerow", lambda path: fetchall_csv(cur, path), os.path.join(tmp, 'old.csv'))
+        measure("export .csv", lambda path: export(cur, 'cases', path), os.path.join(tmp, 'cases.csv'))
+        measure("export .npy", lambda path: export(cur, 'cases', path), os.path.join(tmp, 'cases.npy'))
+        descr, shape, offset = read_npy_header(os.path.join(tmp, 'cases.npy'))
+        print(f"  cases.npy: {shape[0]} records of {descr}, data starts at byte {offset}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
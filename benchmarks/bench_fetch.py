@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from covid_data import daily_url, current_url
+from fetcher import fetch_all
+from stub_server import start_server
+
+#
+# Compares the old one-state-at-a-time requests.get loop with fetch_all
+# against the local stub server. Run with: python benchmarks/bench_fetch.py
+#
+
+STATES = ['al', 'ak', 'az', 'ar', 'ca', 'co', 'ct', 'de', 'fl', 'ga', 'hi', 'id', 'il', 'in', 'ia', 'ks', 'ky', 'la', 'me', 'md', 'ma', 'mi', 'mn', 'ms', 'mo',
+          'mt', 'ne', 'nv', 'nh', 'nj', 'nm', 'ny', 'nc', 'nd', 'oh', 'ok', 'or', 'pa', 'ri', 'sc', 'sd', 'tn', 'tx', 'ut', 'vt', 'va', 'wa', 'wv', 'wi', 'wy']
+
+
+def serial(urls):
+    for url in urls:
+        requests.get(url).json()
+
+
+def report(name, seconds, count):
+    print(f"{name:<28} {seconds:8.3f} s  {count / seconds:8.1f} req/s")
+
+
+def main(latency=0.05):
+    server, api = start_server(latency)
+    urls = [daily_url(s, api) for s in STATES] + [current_url(s, api) for s in STATES]
+    print(f"{len(urls)} requests, {latency * 1000:.0f} ms simulated latency")
+
+    start = time.perf_counter()
+    serial(urls)
+    report("serial requests.get", time.perf_counter() - start, len(urls))
+
+    for workers in (4, 10, 25):
+        start = time.perf_counter()
+        results = fetch_all(urls, max_workers=workers)
+        report(f"fetch_all workers={workers}", time.perf_counter() - start, len(urls))
+        assert all(r is not None for r in results.values())
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
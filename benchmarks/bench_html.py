@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pop_table_parser import extract_population
+from synthetic import population_page
+
+#
+# Parse time and peak memory for reading both census columns out of a saved
+# copy of the Wikipedia page. Run with:
+#   python benchmarks/bench_html.py [saved_page.html]
+# Without a file a synthetic page of similar size is used.
+#
+
+
+def soup_both_years(page, parser):
+    '''The old approach: build the whole tree, then walk the table once per year.'''
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(page, parser)
+    result = {}
+    for col in (3, 4):
+        table = soup.find('table', {'class': 'wikitable sortable'})
+        rows = table.find('tbody').find_all('tr')
+        result[col] = {row.find_all('td')[2].text.strip(): row.find_all('td')[col].text.strip() for row in rows[2:53]}
+    return result
+
+
+def measure(name, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  {name:<28} {elapsed * 1000:9.1f} ms  peak {peak / 1024 / 1024:8.2f} MiB")
+
+
+def main(path=None):
+    if path is None:
+        page = population_page()
+        print(f"synthetic page, {len(page) / 1e6:.2f} MB")
+    else:
+        with open(path, encoding='utf-8') as f:
+            page = f.read()
+        print(f"{path}, {len(page) / 1e6:.2f} MB")
+
+    for parser in ('html.parser', 'lxml'):
+        try:
+            measure(f"BeautifulSoup {parser}", lambda: soup_both_years(page, parser))
+        except Exception as e:
+            print(f"  BeautifulSoup {parser:<14} skipped ({e.__class__.__name__}: {e})")
+    measure("extract_population", lambda: extract_population(page, years=[2020, 2010]))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
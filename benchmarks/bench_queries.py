@@ -0,0 +1,80 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from queries import cases_for_state, cases_on_date, check_query_plans, ensure_indexes
+
+#
+# Full-scan-then-filter versus the indexed query layer on a synthetic
+# database with millions of CovidData rows.
+# Run with: python benchmarks/bench_queries.py [regions] [dates]
+#
+
+JOIN = 'SELECT States.state, Dates.date, CovidData.number_of_cases FROM CovidData JOIN States JOIN Dates ON CovidData.state_id = States.state_id and CovidData.date_id = Dates.date_id'
+
+
+def build_db(path, regions, dates):
+    conn = sqlite3.connect(path)
+    cur = conn.cursor()
+    cur.execute('PRAGMA journal_mode = WAL')
+    cur.execute('PRAGMA synchronous = OFF')
+    cur.execute('CREATE TABLE States ("state_id" INTEGER PRIMARY KEY, "state" TEXT)')
+    cur.execute('CREATE TABLE Dates ("date_id" INTEGER PRIMARY KEY, "date" TEXT)')
+    cur.execute('CREATE TABLE CovidData ("id" INTEGER PRIMARY KEY, "state_id" NUMBER, "date_id" NUMBER, "number_of_cases" NUMBER)')
+    cur.executemany('INSERT INTO States (state) VALUES (?)', [[f'r{i}'] for i in range(regions)])
+    cur.executemany('INSERT INTO Dates (date) VALUES (?)', [[str(20000000 + i)] for i in range(dates)])
+    for d in range(1, dates + 1):
+        cur.executemany('INSERT INTO CovidData (state_id, date_id, number_of_cases) VALUES (?, ?, ?)',
+                        [(s, d, s * d) for s in range(1, regions + 1)])
+    conn.commit()
+    return conn, cur
+
+
+def timed(name, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"  {name:<40} {(time.perf_counter() - start) * 1000:10.1f} ms  {len(result):8} rows")
+    return result
+
+
+def full_scan_on_date(cur, date):
+    cur.execute(JOIN)
+    return [row for row in cur if row[1] == date]
+
+
+def full_scan_for_state(cur, state):
+    cur.execute(JOIN)
+    return [row for row in cur if row[0] == state]
+
+
+def main(regions=1000, dates=2000):
+    regions, dates = int(regions), int(dates)
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        conn, cur = build_db(os.path.join(tmp, 'bench.db'), regions, dates)
+        print(f"{regions} regions x {dates} dates = {regions * dates} rows, built in {time.perf_counter() - start:.1f} s")
+        date = str(20000000 + dates // 2)
+
+        print("no indexes")
+        timed("full join, filter date in Python", lambda: full_scan_on_date(cur, date))
+        timed("full join, filter state in Python", lambda: full_scan_for_state(cur, 'r7'))
+        timed("cases_on_date", lambda: cases_on_date(cur, date))
+
+        start = time.perf_counter()
+        ensure_indexes(cur, conn)
+        print(f"ensure_indexes took {time.perf_counter() - start:.1f} s")
+        for name, plan in check_query_plans(cur).items():
+            print(f"  {name}: {'; '.join(plan)}")
+
+        timed("cases_on_date", lambda: cases_on_date(cur, date))
+        timed("cases_for_state", lambda: cases_for_state(cur, 'r7'))
+        timed("cases_for_state, 30 day window", lambda: cases_for_state(cur, 'r7', date, str(int(date) + 29)))
+        conn.close()
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,76 @@
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import covid_data as cd
+import population_data as pdm
+import viz
+from metrics import compute_metrics
+from population_snapshots import POP_UPSERT
+from queries import cases_on_date, ensure_indexes
+from state_summary import create_summary_tables, refresh_summary, top_states
+from states import STATES, add_regions, region_ids_by_name, region_list
+
+#
+# The region-keyed operations on a registry of 50 up to 5000 regions (the
+# states plus made-up counties), with cases on the two dates and a 2020
+# population for each. Per-region times should stay flat as the count grows.
+# Run with: python benchmarks/bench_regions.py
+#
+
+OPERATIONS = ['register', 'lookups', 'percent_change', 'refresh_summary', 'top_states', 'cases_on_date', 'compute_metrics', 'comparison_chart_data', 'pop_chart_data']
+
+
+def counties(n):
+    return [(f'c{i:05d}', f'County {i}', f'{i:05d}') for i in range(n)]
+
+
+def build_db(regions):
+    conn = sqlite3.connect(':memory:')
+    cur = conn.cursor()
+    cd.state_table(cur, conn, regions)
+    cd.date_table(cur, conn)
+    cd.create_covid_tables(cur, conn)
+    pdm.create_population_table(cur, conn)
+    ensure_indexes(cur, conn)
+    ids = cd.date_ids(cur)
+    count = len(regions)
+    cur.executemany(cd.COVID_INSERT, [(s, ids[date], s * (10 + d)) for d, date in enumerate((cd.DEC_DATE, cd.MAR_DATE))
+                                      for s in range(1, count + 1)])
+    cur.executemany(POP_UPSERT, [(s, 2020, s * 1000 + 7) for s in range(1, count + 1)])
+    conn.commit()
+    create_summary_tables(cur, conn)
+    return conn, cur
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    print(f"{'regions':>8} " + ' '.join(f'{name:>22}' for name in OPERATIONS) + "   (us per region)")
+    for size in (50, 500, 5000):
+        regions = STATES + counties(size - len(STATES))
+        conn, cur = build_db(regions)
+        times = {
+            'register': timed(lambda: add_regions(cur, conn, regions)),
+            'lookups': timed(lambda: (region_list(cur), region_ids_by_name(cur))),
+            'percent_change': timed(lambda: cd.percent_change(cur, conn)),
+            'refresh_summary': timed(lambda: refresh_summary(cur, conn, cd.DEC_DATE, cd.MAR_DATE)),
+            'top_states': timed(lambda: top_states(cur, 'percent_change', 10)),
+            'cases_on_date': timed(lambda: cases_on_date(cur, cd.DEC_DATE)),
+            'compute_metrics': timed(lambda: compute_metrics(cur)),
+            'comparison_chart_data': timed(lambda: viz.comparison_chart_data(cur)),
+            'pop_chart_data': timed(lambda: viz.pop_chart_data(cur)),
+        }
+        print(f"{size:>8} " + ' '.join(f'{times[name] / size * 1e6:>22.2f}' for name in OPERATIONS))
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from bulk_insert import apply_pragmas
+from change_engine import compute_changes
+from covid_data import (COVID_SERIES_INSERT, create_covid_tables, date_table, fetch_series_batch, state_ids,
+                        state_table)
+from ingest_scheduler import create_checkpoint_table, run_ingest
+from queries import ensure_indexes
+from state_summary import create_summary_tables, refresh_summary
+from stub_server import start_server
+
+#
+# Full-series ingest (covid_data.py --series) of 50 states x days of
+# daily.json from the local stub server into a fresh database: load time,
+# rows, database size, and how long a percent change over an arbitrary
+# window takes once the series is stored.
+# Run with: python benchmarks/bench_series.py [days] [latency]
+#
+
+
+def main(days=420, latency=0.01):
+    days, latency = int(days), float(latency)
+    server, api = start_server(latency, days=days)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        conn = sqlite3.connect(path)
+        apply_pragmas(conn, db.PRAGMAS)
+        cur = conn.cursor()
+        state_table(cur, conn)
+        date_table(cur, conn)
+        create_covid_tables(cur, conn)
+        ensure_indexes(cur, conn)
+        create_summary_tables(cur, conn)
+        create_checkpoint_table(cur, conn)
+
+        ids = state_ids(cur)
+        units = [(state, 'series') for state in ids]
+        fetch_batch = lambda batch: fetch_series_batch(cur, conn, batch, ids, api=api)
+
+        start = time.perf_counter()
+        remaining = run_ingest(cur, conn, 'covid_series', units, fetch_batch, COVID_SERIES_INSERT, 25, many=True)
+        load = time.perf_counter() - start
+        assert remaining == 0
+
+        cur.execute('SELECT COUNT(*) FROM CovidData')
+        rows = cur.fetchone()[0]
+        cur.execute('SELECT COUNT(*) FROM Dates')
+        dates = cur.fetchone()[0]
+        cur.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        size = os.path.getsize(path)
+        print(f"{len(units)} states x {days} days: {rows} CovidData rows, {dates} dates")
+        print(f"  load       {load:8.2f} s  {rows / load:10.0f} rows/s  ({server.stats['requests']} requests)")
+        print(f"  db size    {size / 1e6:8.2f} MB  {size / rows:6.1f} bytes/row")
+
+        start = time.perf_counter()
+        run_ingest(cur, conn, 'covid_series', units, fetch_batch, COVID_SERIES_INSERT, 25, many=True)
+        print(f"  rerun      {(time.perf_counter() - start) * 1000:8.1f} ms  ({server.stats['requests']} requests)")
+
+        cur.execute('SELECT MIN(date), MAX(date) FROM Dates')
+        first, last = cur.fetchone()
+        for window in ((first, last), ('20201201', '20210307'), ('20210101', '20210131')):
+            start = time.perf_counter()
+            changes = compute_changes(cur, dates=list(window), baseline='first')
+            refreshed = refresh_summary(cur, conn, *window)
+            print(f"  window {window[0]}-{window[1]}  {(time.perf_counter() - start) * 1000:8.1f} ms  "
+                  f"{len(changes)} changes, {refreshed} summaries")
+        conn.close()
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
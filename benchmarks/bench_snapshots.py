@@ -0,0 +1,65 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import covid_data as cd
+import population_data as pdm
+from population_snapshots import create_snapshot_table, ingest_snapshots
+from states import regions_for
+from synthetic import population_page
+
+#
+# Loads a set of saved population pages (synthetic, each with its own pair of
+# years) with one parse process and with a pool, then loads them again
+# unchanged, which should only cost reading and hashing the files.
+# Run with: python benchmarks/bench_snapshots.py [pages] [workers]
+#
+
+
+def write_pages(directory, pages):
+    paths = []
+    page = population_page()
+    for i in range(pages):
+        #relabel the census columns so every snapshot adds years of its own
+        text = page.replace('April 1, 2020', f'April 1, {1800 + 2 * i}').replace('April 1, 2010', f'April 1, {1801 + 2 * i}')
+        path = os.path.join(directory, f'snapshot{i}.html')
+        with open(path, 'w') as f:
+            f.write(text)
+        paths.append(path)
+    return paths
+
+
+def load(sources, workers):
+    conn = sqlite3.connect(':memory:')
+    cur = conn.cursor()
+    cd.state_table(cur, conn, regions_for('all'))
+    pdm.create_population_table(cur, conn)
+    create_snapshot_table(cur, conn)
+    ids = pdm.state_ids_by_name(cur)
+
+    start = time.perf_counter()
+    first = ingest_snapshots(cur, conn, sources, ids, workers=workers)
+    first_time = time.perf_counter() - start
+    start = time.perf_counter()
+    again = ingest_snapshots(cur, conn, sources, ids, workers=workers)
+    again_time = time.perf_counter() - start
+    conn.close()
+    print(f"  {workers} workers: first load {first_time * 1000:8.1f} ms ({first['rows']} rows), "
+          f"unchanged re-run {again_time * 1000:8.1f} ms ({again['skipped']} skipped)")
+
+
+def main(pages=8, workers=4):
+    pages, workers = int(pages), int(workers)
+    with tempfile.TemporaryDirectory() as tmp:
+        sources = write_pages(tmp, pages)
+        print(f"{pages} snapshots of {os.path.getsize(sources[0]) / 1e6:.1f} MB each")
+        load(sources, 1)
+        load(sources, workers)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
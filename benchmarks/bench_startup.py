@@ -0,0 +1,73 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db
+from bulk_insert import apply_pragmas
+
+#
+# Startup cost of the three scripts. "eager" imports matplotlib, bs4 and
+# requests up front the way every script used to, "lazy" imports just the
+# script, which now pulls in only what it uses. Also times opening a
+# configured connection per call against reusing the shared one.
+# Run with: python benchmarks/bench_startup.py [runs]
+#
+
+SCRIPTS = ['covid_data', 'population_data', 'viz']
+HEAVY = 'import matplotlib.pyplot, bs4, requests'
+
+
+def import_time(code, runs):
+    '''Returns the fastest wall time of running python -c code in a fresh interpreter.'''
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(runs=5):
+    runs = int(runs)
+    print(f"interpreter startup, best of {runs}")
+    print(f"  {'bare python':<20} {import_time('pass', runs) * 1000:8.1f} ms")
+    for script in SCRIPTS:
+        eager = import_time(f'{HEAVY}; import {script}', runs)
+        lazy = import_time(f'import {script}', runs)
+        print(f"  {script:<20} eager {eager * 1000:8.1f} ms   lazy {lazy * 1000:8.1f} ms")
+
+    calls = 1000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        sqlite3.connect(path).execute('CREATE TABLE States ("state_id" INTEGER PRIMARY KEY, "state" TEXT)')
+
+        start = time.perf_counter()
+        for _ in range(calls):
+            conn = sqlite3.connect(path)
+            apply_pragmas(conn, db.PRAGMAS)
+            conn.execute('SELECT COUNT(*) FROM States').fetchone()
+            conn.close()
+        per_call = time.perf_counter() - start
+
+        db.database_path = lambda db_name: os.path.join(tmp, db_name)
+        start = time.perf_counter()
+        for _ in range(calls):
+            cur, conn = db.setUpDatabase('bench.db')
+            cur.execute('SELECT COUNT(*) FROM States').fetchone()
+        shared = time.perf_counter() - start
+        db.close_connections()
+
+    print(f"{calls} connect + query")
+    print(f"  {'new connection each':<20} {per_call * 1000:8.1f} ms")
+    print(f"  {'shared connection':<20} {shared * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
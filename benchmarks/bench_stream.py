@@ -0,0 +1,73 @@
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_stream import find_dates, iter_file_chunks, iter_json_array
+
+#
+# Compares json.loads on the whole daily.json history with the streaming
+# parser on a synthetic multi-year file. Run with: python benchmarks/bench_stream.py
+#
+
+
+def write_history(path, years):
+    '''Writes a newest-first daily.json style file covering the given number of years.'''
+    days = int(years * 365)
+    last = datetime.date(2021, 3, 7)
+    with open(path, 'w') as f:
+        f.write('[')
+        for i in range(days):
+            date = int((last - datetime.timedelta(days=i)).strftime('%Y%m%d'))
+            record = {"date": date, "state": "CA", "positive": 3500000 - i * 100,
+                      "negative": 40000000 - i * 1000, "hospitalizedCurrently": 5000, "deathIncrease": 100,
+                      "totalTestResults": 49000000 - i * 2000, "dataQualityGrade": "A", "hash": "x" * 40}
+            if i:
+                f.write(',')
+            f.write(json.dumps(record))
+        f.write(']')
+    return days
+
+
+def measure(name, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  {name:<26} {elapsed * 1000:9.1f} ms  peak {peak / 1024:10.1f} KiB")
+    return result
+
+
+def full_load(path, targets):
+    with open(path) as f:
+        curr_info = json.loads(f.read())
+    curr_info.reverse()
+    found = {}
+    for day in curr_info:
+        if day["date"] in targets:
+            found[day["date"]] = day
+    return found
+
+
+def main():
+    targets = {20201201, 20210101}
+    with tempfile.TemporaryDirectory() as tmp:
+        for years in (1, 10, 100):
+            path = os.path.join(tmp, 'daily.json')
+            days = write_history(path, years)
+            print(f"{years} years, {days} records, {os.path.getsize(path) / 1e6:.1f} MB")
+            expected = measure("json.loads + full scan", lambda: full_load(path, targets))
+            found = measure("streaming, early stop", lambda: find_dates(iter_json_array(iter_file_chunks(path)), targets))
+            measure("streaming, full pass", lambda: sum(1 for _ in iter_json_array(iter_file_chunks(path))))
+            assert found == expected
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulk_insert import BulkWriter, apply_pragmas
+
+#
+# Loads dates x 50 states of synthetic CovidData rows two ways: the old
+# CREATE TABLE + INSERT + commit per row, and BulkWriter with WAL and
+# synchronous=NORMAL. Run with: python benchmarks/bench_writes.py [dates]
+#
+
+CREATE = 'CREATE TABLE IF NOT EXISTS CovidData ("id" INTEGER PRIMARY KEY, "state_id" NUMBER, "date_id" NUMBER, "number_of_cases" NUMBER)'
+INSERT = 'INSERT INTO CovidData (state_id, date_id, number_of_cases) VALUES (?, ?, ?)'
+
+
+def synthetic_rows(dates, states=50):
+    for date_id in range(1, dates + 1):
+        for state_id in range(1, states + 1):
+            yield (state_id, date_id, state_id * 1000 + date_id)
+
+
+def per_row_commit(path, rows):
+    conn = sqlite3.connect(path)
+    cur = conn.cursor()
+    for row in rows:
+        cur.execute(CREATE)
+        cur.execute(INSERT, row)
+        conn.commit()
+    conn.close()
+
+
+def bulk(path, rows, flush_size, pragmas):
+    conn = sqlite3.connect(path)
+    if pragmas:
+        apply_pragmas(conn)
+    conn.execute(CREATE)
+    with BulkWriter(conn, INSERT, flush_size) as writer:
+        writer.add_many(rows)
+    conn.close()
+
+
+def run(name, dates, load):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        rows = list(synthetic_rows(dates))
+        start = time.perf_counter()
+        load(path, rows)
+        elapsed = time.perf_counter() - start
+        count = sqlite3.connect(path).execute('SELECT COUNT(*) FROM CovidData').fetchone()[0]
+        assert count == len(rows)
+        print(f"  {name:<40} {elapsed:8.3f} s  {len(rows) / elapsed:12.0f} rows/s")
+
+
+def main(dates=400):
+    print(f"{dates} dates x 50 states = {dates * 50} rows")
+    #the per-row path is slow enough that a slice of the data is plenty to get its rate
+    run("per-row commit (first 2 dates)", min(dates, 2), per_row_commit)
+    run("BulkWriter flush=1000, default pragmas", dates, lambda p, r: bulk(p, r, 1000, False))
+    run("BulkWriter flush=1000, WAL/NORMAL", dates, lambda p, r: bulk(p, r, 1000, True))
+    run("BulkWriter flush=50000, WAL/NORMAL", dates, lambda p, r: bulk(p, r, 50000, True))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
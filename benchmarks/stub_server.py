@@ -0,0 +1,86 @@
+import functools
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from synthetic import current_record, daily_records, population_page
+
+#
+# Local stand-in for the COVID Tracking Project API and the Wikipedia
+# population page, so the fetch code can be benchmarked without touching
+# the real network. Payloads come from synthetic.py and are built once per
+# path. Responses carry an ETag and honour If-None-Match, and the server
+# counts what it sends in server.stats.
+#
+
+STATE_PATH = re.compile(r'^/v1/states/([a-z]+)/(daily|current)\.json$')
+WIKI_PATH = re.compile(r'^/wiki/[^/]+$')
+
+
+def make_handler(latency, days, filler):
+    @functools.lru_cache(maxsize=None)
+    def payload(path):
+        '''Returns (body, content type, etag) for a path, or None for a path the stub doesn't serve.'''
+        match = STATE_PATH.match(path)
+        if match is not None:
+            state, kind = match.groups()
+            if kind == 'daily':
+                data = daily_records(state, days)
+            else:
+                data = current_record(state, days)
+            body, content_type = json.dumps(data).encode(), 'application/json'
+        elif WIKI_PATH.match(path):
+            body, content_type = population_page(filler).encode(), 'text/html; charset=utf-8'
+        else:
+            return None
+        return body, content_type, '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            found = payload(self.path)
+            if found is None:
+                self.send_error(404)
+                return
+            body, content_type, etag = found
+
+            time.sleep(latency)
+            self.server.stats['requests'] += 1
+            if self.headers.get('If-None-Match') == etag:
+                self.server.stats['not_modified'] += 1
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            self.server.stats['bytes'] += len(body)
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def start_server(latency=0.05, port=0, days=30, filler=2000):
+    '''This function takes in the simulated per-request latency in seconds, a port (0 picks a free one), how
+    many days of history daily.json returns and the amount of filler around the population table.
+    It starts the stub server on a background thread and returns the server and its base url,
+    which can be passed in place of covid_data.COVID_API. The population page is at server.page_url.'''
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(latency, days, filler))
+    server.daemon_threads = True
+    server.stats = {'requests': 0, 'not_modified': 0, 'bytes': 0}
+    server.page_url = f"http://127.0.0.1:{server.server_address[1]}/wiki/List_of_states_and_territories_of_the_United_States_by_population"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
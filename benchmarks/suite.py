@@ -0,0 +1,231 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import covid_data as cd
+import db
+import population_data as pdm
+import viz
+from bulk_insert import apply_pragmas
+from http_cache import HttpCache
+from ingest_scheduler import create_checkpoint_table, run_ingest
+from population_snapshots import create_snapshot_table, ingest_snapshots
+from queries import ensure_indexes
+from state_summary import create_summary_tables, refresh_summary
+from stub_server import start_server
+
+#
+# Scenario benchmarks for the whole pipeline against synthetic data served
+# by the local stub server: the three ingests, percent_change,
+# percent_changes and every viz chart (query, and render when matplotlib is
+# installed). Results can be saved and later runs compared against them.
+#   python benchmarks/suite.py --save baseline.json
+#   python benchmarks/suite.py --baseline baseline.json
+# A scenario whose median is more than --threshold slower than the
+# baseline's is reported as a regression and the exit status is 1.
+#
+
+THRESHOLD = 0.2
+# fast scenarios are repeated within a run until it takes at least this long, and timed per call
+MIN_RUN_SECONDS = 0.05
+
+
+def new_database(path):
+    '''Creates a fresh database at path with every table and index the scripts set up. Returns cur and conn.'''
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn, db.PRAGMAS)
+    cur = conn.cursor()
+    cd.state_table(cur, conn)
+    cd.date_table(cur, conn)
+    cd.create_covid_tables(cur, conn)
+    pdm.create_population_table(cur, conn)
+    ensure_indexes(cur, conn)
+    create_summary_tables(cur, conn)
+    create_checkpoint_table(cur, conn)
+    create_snapshot_table(cur, conn)
+    return cur, conn
+
+
+def ingest_two_dates(ctx, cur, conn):
+    ids_by_state = cd.state_ids(cur)
+    ids_by_date = cd.date_ids(cur)
+    units = [(state, date) for date in (cd.DEC_DATE, cd.MAR_DATE) for state in ids_by_state]
+    fetch_batch = lambda batch: cd.fetch_covid_batch(batch, ids_by_state, ids_by_date, api=ctx['api'])
+    return run_ingest(cur, conn, 'covid', units, fetch_batch, cd.COVID_INSERT, 25)
+
+
+def ingest_series(ctx, cur, conn):
+    ids_by_state = cd.state_ids(cur)
+    units = [(state, 'series') for state in ids_by_state]
+    fetch_batch = lambda batch: cd.fetch_series_batch(cur, conn, batch, ids_by_state, api=ctx['api'])
+    return run_ingest(cur, conn, 'covid_series', units, fetch_batch, cd.COVID_SERIES_INSERT, 25, many=True)
+
+
+def ingest_population(ctx, cur, conn):
+    path = os.path.join(ctx['tmp'], 'http_cache.db')
+    if os.path.exists(path):
+        os.remove(path)
+    cache = HttpCache(path)
+    ingest_snapshots(cur, conn, [ctx['page_url']], pdm.state_ids_by_name(cur), cache)
+    cache.close()
+
+
+INGESTS = {
+    'ingest.covid_two_dates': ingest_two_dates,
+    'ingest.covid_series': ingest_series,
+    'ingest.population': ingest_population,
+}
+
+
+def query_scenarios(ctx, cur, conn):
+    '''Returns a dictionary of scenario name to a function timing one call against the populated database.'''
+    states = list(cd.state_ids(cur))
+    scenarios = {
+        'percent_change': lambda: cd.percent_change(cur, conn, states),
+        'percent_changes': lambda: pdm.percent_changes(cur, conn, os.path.join(ctx['tmp'], 'pop_calculations.csv')),
+    }
+    can_render = importlib.util.find_spec('matplotlib') is not None
+    for name, (query, draw) in viz.CHARTS.items():
+        scenarios[f'viz.{name}.query'] = lambda query=query: query(cur)
+        if can_render:
+            scenarios[f'viz.{name}.render'] = lambda name=name, query=query: viz.render_chart(name, query(cur), ctx['tmp'], ('png',))
+    return scenarios
+
+
+def summarize(times):
+    return {'runs': len(times), 'min': min(times), 'median': statistics.median(times), 'max': max(times)}
+
+
+def quietly(func, number=1):
+    '''Calls func number times with stdout silenced, since the ingest code prints its progress. Returns the
+    elapsed seconds per call.'''
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        return (time.perf_counter() - start) / number
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def selected(name, only):
+    return not only or any(part in name for part in only)
+
+
+def run_suite(days=420, latency=0.005, filler=2000, runs=5, only=()):
+    '''This function takes in the data scale (days of history per state, filler around the population table),
+    the stub server latency in seconds, the number of runs per scenario and optional name filters. Runs every
+    selected scenario runs times, each ingest into a fresh database. Returns the results dictionary that
+    save_results writes.'''
+    server, api = start_server(latency, days=days, filler=filler)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        ctx = {'tmp': tmp, 'api': api, 'page_url': server.page_url}
+        path = os.path.join(tmp, 'bench.db')
+
+        for name, ingest in INGESTS.items():
+            if not selected(name, only):
+                continue
+            times = []
+            #the first run only warms up the stub server and the caches
+            for _ in range(runs + 1):
+                cur, conn = new_database(path)
+                times.append(quietly(lambda: ingest(ctx, cur, conn)))
+                conn.close()
+            results[name] = summarize(times[1:])
+            print(f"  {name:<40} {results[name]['median'] * 1000:10.3f} ms")
+
+        cur, conn = new_database(path)
+        quietly(lambda: ingest_series(ctx, cur, conn))
+        quietly(lambda: ingest_population(ctx, cur, conn))
+        refresh_summary(cur, conn, cd.DEC_DATE, cd.MAR_DATE)
+        for name, func in query_scenarios(ctx, cur, conn).items():
+            if not selected(name, only):
+                continue
+            number = max(1, int(MIN_RUN_SECONDS / max(quietly(func), 1e-9)))
+            times = [quietly(func, number) for _ in range(runs)]
+            results[name] = summarize(times)
+            print(f"  {name:<40} {results[name]['median'] * 1000:10.3f} ms")
+        conn.close()
+
+    server.shutdown()
+    return {
+        'meta': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version, 'platform': platform.platform(),
+                 'days': days, 'latency': latency, 'filler': filler, 'runs': runs},
+        'results': results,
+    }
+
+
+def save_results(data, path):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def compare(data, baseline, threshold=THRESHOLD):
+    '''This function takes in the results of this run, the saved baseline results and the allowed slowdown as a
+    fraction. Prints each scenario's median against the baseline's. Returns the list of scenarios that got slower
+    than the threshold allows.'''
+    for key in ('days', 'latency', 'filler'):
+        if data['meta'][key] != baseline['meta'].get(key):
+            print(f"warning: {key} is {data['meta'][key]} but the baseline used {baseline['meta'].get(key)}")
+
+    regressions = []
+    print(f"  {'scenario':<40} {'baseline':>10} {'now':>10} {'ratio':>7}")
+    for name, result in data['results'].items():
+        if name not in baseline['results']:
+            print(f"  {name:<40} {'-':>10} {result['median'] * 1000:8.3f}ms     new")
+            continue
+        before = baseline['results'][name]['median']
+        ratio = result['median'] / before if before else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"  {name:<40} {before * 1000:8.3f}ms {result['median'] * 1000:8.3f}ms {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the scenario benchmarks against synthetic data')
+    parser.add_argument('--days', type=int, default=420, help='days of history per state in daily.json')
+    parser.add_argument('--latency', type=float, default=0.005, help='stub server latency per request, in seconds')
+    parser.add_argument('--filler', type=int, default=2000, help='filler paragraphs around the population table')
+    parser.add_argument('--runs', type=int, default=5, help='runs per scenario; the median is compared')
+    parser.add_argument('--only', nargs='+', default=[], help='only run scenarios whose name contains one of these')
+    parser.add_argument('--save', metavar='PATH', help='write the results to PATH as JSON')
+    parser.add_argument('--baseline', metavar='PATH', help='compare against results saved with --save')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='allowed slowdown against the baseline, as a fraction')
+    args = parser.parse_args(argv)
+
+    print(f"50 states x {args.days} days, {args.latency * 1000:.0f} ms latency, {args.runs} runs per scenario")
+    data = run_suite(args.days, args.latency, args.filler, args.runs, args.only)
+    if args.save:
+        save_results(data, args.save)
+        print(f"saved results to {args.save}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(data, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} scenarios slower than the baseline: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
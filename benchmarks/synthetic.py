@@ -0,0 +1,53 @@
+import datetime
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from states import STATE_NAMES
+
+#
+# Synthetic stand-ins for the pages and payloads the project downloads.
+#
+
+EXTRA_ROWS = ['District of Columbia', 'Puerto Rico', 'Guam', 'U.S. Virgin Islands']
+LAST_DAY = datetime.date(2021, 3, 7)
+
+
+def daily_records(state, days=30, last=LAST_DAY):
+    '''Returns a newest-first list of days records shaped like states/{state}/daily.json, ending on last.
+    Cases grow every day and differ per state, so percent changes and rankings aren't all ties.'''
+    base = (sum(map(ord, state)) % 50 + 1) * 1000
+    records = []
+    for i in range(days):
+        day = days - 1 - i
+        records.append({"date": int((last - datetime.timedelta(days=i)).strftime('%Y%m%d')), "state": state.upper(),
+                        "positive": base + day * (base // 100 + day), "death": day * 3, "totalTestResults": day * 1000})
+    return records
+
+
+def current_record(state, days=30, last=LAST_DAY):
+    '''Returns a record shaped like states/{state}/current.json, matching the newest day of daily_records.'''
+    return daily_records(state, days, last)[0]
+
+
+def population_page(filler=2000):
+    '''Returns html shaped like the Wikipedia "by population" page: a two row header with the census years
+    under a colspan, rank columns before the state name, footnotes, and filler paragraphs and other tables
+    around it so the page is roughly as big as the real one.'''
+    rows = []
+    for i, name in enumerate(list(STATE_NAMES.values()) + EXTRA_ROWS):
+        rows.append(f'<tr><td>{i + 1}</td><td>{i + 1}</td>'
+                    f'<td><span class="flagicon"><img src="/flag{i}.png"/></span>&#160;<a href="/wiki/{name}">{name}</a></td>'
+                    f'<td>{(i + 1) * 123457:,}</td><td>{(i + 1) * 111111:,}<sup class="reference"><a href="#cite{i}">[{i}]</a></sup></td>'
+                    f'<td>+{i % 9}.{i % 7}%</td></tr>')
+    header = ('<table class="wikitable sortable plainrowheaders"><tbody>'
+              '<tr><th rowspan="2">Rank in states &amp; territories, 2020</th><th rowspan="2">Rank in states &amp; territories, 2010</th>'
+              '<th rowspan="2">State or territory</th><th colspan="2">Census population<sup>[8]</sup></th><th rowspan="2">Change, 2010–2020</th></tr>'
+              '<tr><th>April 1, 2020</th><th>April 1, 2010</th></tr>')
+    paragraph = '<p>Filler text with <b>bold</b>, <i>italics</i> and a <a href="/wiki/Link">link</a>.<sup>[1]</sup></p>'
+    before = '<html><head><title>Population</title></head><body>' + paragraph * (filler // 4)
+    before += '<table class="infobox"><tr><th>Infobox</th></tr><tr><td>1</td></tr></table>'
+    after = '<table class="wikitable sortable"><tr><th>Another table</th></tr><tr><td>1</td></tr></table>'
+    after += paragraph * filler + '</body></html>'
+    return before + header + ''.join(rows) + '</tbody></table>' + after
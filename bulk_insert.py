@@ -0,0 +1,64 @@
+import instrument
+
+#
+# Bulk ingest helpers. Rows are buffered and written with executemany,
+# one transaction per flush instead of one commit per row.
+#
+
+DEFAULT_PRAGMAS = {'journal_mode': 'WAL', 'synchronous': 'NORMAL'}
+
+
+def apply_pragmas(conn, pragmas=None):
+    '''This function takes in a connection and a dictionary of pragma name to value (WAL journal mode and
+    synchronous=NORMAL by default) and sets each of them on the connection. Returns nothing.'''
+    if pragmas is None:
+        pragmas = DEFAULT_PRAGMAS
+    for name, value in pragmas.items():
+        conn.execute(f'PRAGMA {name} = {value}')
+
+
+class BulkWriter:
+    '''Buffers rows for one INSERT statement and writes them with executemany once flush_size rows
+    have been added. Each flush runs inside a single transaction. Use as a context manager, or call
+    close() at the end, so the last partial batch gets written.'''
+
+    def __init__(self, conn, sql, flush_size=1000):
+        self.conn = conn
+        self.sql = sql
+        self.flush_size = flush_size
+        self.rows = []
+        self.rows_written = 0
+        self.commits = 0
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.flush_size:
+            self.flush()
+
+    def add_many(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def flush(self):
+        if not self.rows:
+            return
+        with self.conn:
+            self.conn.executemany(self.sql, self.rows)
+        self.rows_written += len(self.rows)
+        self.commits += 1
+        instrument.count('rows_written', len(self.rows))
+        instrument.count('commits')
+        self.rows = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        #only write the buffered rows if the block finished cleanly
+        if exc_type is None:
+            self.flush()
+        else:
+            self.rows = []
@@ -0,0 +1,70 @@
+from queries import has_typed_population
+
+#
+# Percent, absolute and per-capita change in COVID cases for every state
+# over any number of dates, computed in one pass with SQLite window
+# functions instead of rescanning the joined rows once per state.
+#
+
+CHANGE_SQL = '''
+WITH windowed AS (
+    SELECT CovidData.state_id, Dates.date, CovidData.number_of_cases AS cases,
+        {base_date} OVER w AS base_date,
+        {base_cases} OVER w AS base_cases
+    FROM CovidData
+    JOIN Dates ON CovidData.date_id = Dates.date_id
+    {where}
+    WINDOW w AS (PARTITION BY CovidData.state_id ORDER BY Dates.date)
+){population_cte}
+SELECT windowed.state_id, States.state, base_date, date, base_cases, cases,
+    cases - base_cases,
+    CASE WHEN base_cases != 0 THEN (cases - base_cases) * 100.0 / base_cases END,
+    {per_capita}
+FROM windowed
+JOIN States ON windowed.state_id = States.state_id
+{population_join}
+WHERE base_date IS NOT NULL AND base_date != date
+'''
+
+#one population row per state, looked up once instead of once per output row
+POPULATION_CTE = ''', state_population AS (
+    SELECT state_id, population FROM Population WHERE year = ?
+)'''
+
+BASELINES = {
+    'previous': ('LAG(Dates.date)', 'LAG(CovidData.number_of_cases)'),
+    'first': ('FIRST_VALUE(Dates.date)', 'FIRST_VALUE(CovidData.number_of_cases)'),
+}
+
+
+def compute_changes(cur, dates=None, baseline='previous', pop_year=2020):
+    '''This function takes in the cursor, an optional collection of YYYYMMDD dates (every stored date if None),
+    the baseline to compare against ('previous' for day over day, 'first' for change since the earliest date)
+    and the population year used for per-capita change. Returns a list of
+    (state_id, state, from_date, to_date, from_cases, to_cases, absolute_change, percent_change, per_capita_change)
+    tuples for every state and date after the first, ordered by state and then date. Per-capita change is None
+    when there is no population row, or no Population table in the (state_id, year) form.'''
+    base_date, base_cases = BASELINES[baseline]
+    params = []
+
+    where = ''
+    if dates is not None:
+        dates = [str(date) for date in dates]
+        where = f"WHERE Dates.date IN ({', '.join('?' * len(dates))})"
+        params.extend(dates)
+
+    per_capita = 'NULL'
+    population_cte = ''
+    population_join = ''
+    #an old "State:YYYY" Population table has no state_id to join on, so per-capita change waits for the migration
+    if has_typed_population(cur):
+        per_capita = '(cases - base_cases) * 1.0 / state_population.population'
+        population_cte = POPULATION_CTE
+        population_join = 'LEFT JOIN state_population ON windowed.state_id = state_population.state_id'
+        params.append(int(pop_year))
+
+    #the window already walks each state's rows in date order, so no extra ORDER BY is needed
+    sql = CHANGE_SQL.format(where=where, base_date=base_date, base_cases=base_cases, per_capita=per_capita,
+                            population_cte=population_cte, population_join=population_join)
+    cur.execute(sql, params)
+    return cur.fetchall()
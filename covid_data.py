@@ -1,52 +1,44 @@
 import requests
-import sqlite3
 import json
 import os
-from bs4 import BeautifulSoup
-import matplotlib.pyplot as plt
-import csv
+import argparse
+import instrument
+from db import setUpDatabase
+from export import export
+from states import STATES, add_regions, create_region_table, region_list, regions_for
+from change_engine import compute_changes
+from queries import ensure_indexes
+from state_summary import create_summary_tables, refresh_summary
+from ingest_scheduler import create_checkpoint_table, run_ingest, seed_checkpoints
+from fetcher import fetch_all, fetch_json, make_session
+from json_stream import find_dates, iter_json_array
+from http_cache import HttpCache
 
 #
 # Name: Mingxuan Sun
 # Who did you work with: Tiara Amadia
 #
 
-def setUpDatabase(db_name):
-    '''This function takes in the name of the database, makes a connection to server
-    using name given, and returns cur and conn as the cursor and connection variable
-    to allow database access.'''
-    
-    path = os.path.dirname(os.path.abspath(__file__))
-    conn = sqlite3.connect(path+'/'+db_name)
-    cur = conn.cursor()
-    return cur, conn
-
-def state_table(cur, conn):
-    '''Takes in the cur and conn variables. Creates a table called States that has lowercase
-    abbreviations for all 50 states and a state_id primary key for each.'''
-    states_list_1 = ['al', 'ak', 'az', 'ar', 'ca', 'co', 'ct', 'de', 'fl', 'ga', 'hi', 'id', 'il', 'in', 'ia', 'ks', 'ky', 'la', 'me', 'md', 'ma', 'mi', 'mn', 'ms', 'mo']
-    states_list_2 = ['mt', 'ne', 'nv', 'nh', 'nj', 'nm', 'ny', 'nc', 'nd', 'oh', 'ok', 'or', 'pa', 'ri', 'sc', 'sd', 'tn', 'tx', 'ut', 'vt', 'va', 'wa', 'wv', 'wi', 'wy']
-
-    cur.execute('CREATE TABLE IF NOT EXISTS States ("state_id" INTEGER PRIMARY KEY, "state" TEXT)')
-    #avoids inserting values multiple times
-    cur.execute('SELECT MAX(state_id) FROM States')
-    data = cur.fetchone()
-    num = data[0]
-    if type(num) == int:
-        return
-
-    for state in states_list_1:
-        cur.execute('INSERT INTO States (state) VALUES (?)', [state])
-        conn.commit()
-    
-    for state in states_list_2:
-        cur.execute('INSERT INTO States (state) VALUES (?)', [state])
-        conn.commit()
+COVID_API = "https://api.covidtracking.com/v1"
+DEC_DATE = 20201201
+MAR_DATE = 20210307
+COVID_INSERT = 'INSERT INTO CovidData (state_id, date_id, number_of_cases) VALUES (?, ?, ?)'
+#skips days that are already loaded, e.g. the two dates the default mode fetched
+COVID_SERIES_INSERT = ('INSERT INTO CovidData (state_id, date_id, number_of_cases) SELECT ?1, ?2, ?3 '
+                       'WHERE NOT EXISTS (SELECT 1 FROM CovidData WHERE state_id = ?1 AND date_id = ?2)')
+
+def state_table(cur, conn, regions=STATES):
+    '''Takes in the cur and conn variables and a list of (abbreviation, name, FIPS) regions, the 50 states by default.
+    Creates the States region registry, with a state_id primary key for each region, and adds the regions it
+    doesn't have yet. Regions already stored keep their state_id.'''
+    create_region_table(cur, conn)
+    add_regions(cur, conn, regions)
 
 def date_table(cur, conn):
     '''Takes in the cur and conn variables. Creates a table called Dates that holds the two date values
-     and a date_id primary key for each.'''
+     and a date_id primary key for each. Dates are unique, so add_dates can add more of them safely.'''
     cur.execute('CREATE TABLE IF NOT EXISTS Dates ("date_id" INTEGER PRIMARY KEY, "date" TEXT)')
+    cur.execute('CREATE UNIQUE INDEX IF NOT EXISTS Dates_date_unique ON Dates (date)')
     #avoids inserting values multiple times
     cur.execute('SELECT MAX(date_id) FROM Dates')
     data = cur.fetchone()
@@ -54,52 +46,78 @@ def date_table(cur, conn):
     if type(num) == int:
         return
     
-    date_1 = 20201201
-    date_2 = 20210307
-    cur.execute('INSERT INTO Dates (date) VALUES (?)', [date_1])
-    cur.execute('INSERT INTO Dates (date) VALUES (?)', [date_2])
+    cur.execute('INSERT INTO Dates (date) VALUES (?)', [DEC_DATE])
+    cur.execute('INSERT INTO Dates (date) VALUES (?)', [MAR_DATE])
     conn.commit()
 
-def covid_table(cur, conn, state, date, positive):
-    #STATE MUST BE LOWERCASE
-    '''This function takes in cursor and connection variables to database, state,
-    date, and number of positive COVID cases for that state. It creates a table in the database
-    if it doesn't exist and inserts the state, date, and number of positive cases. Returns nothing.'''
+def add_dates(cur, conn, dates):
+    '''Takes in the cur and conn variables and a collection of YYYYMMDD dates. Adds the ones that aren't in
+    Dates yet in one transaction. Returns nothing.'''
+    cur.executemany('INSERT OR IGNORE INTO Dates (date) VALUES (?)', [(str(date),) for date in sorted(set(dates))])
+    conn.commit()
 
+def create_covid_tables(cur, conn):
+    '''Takes in the cur and conn variables. Creates the CovidData and PercentChange tables if they
+    don't exist. Called once per connection so the per-row inserts don't have to. Returns nothing.'''
     cur.execute('CREATE TABLE IF NOT EXISTS CovidData ("id" INTEGER PRIMARY KEY, "state_id" NUMBER, "date_id" NUMBER, "number_of_cases" NUMBER)')
-    cur.execute('INSERT INTO CovidData (state_id, date_id, number_of_cases) VALUES (?, ?, ?)', (state, date, positive))
+    cur.execute('CREATE TABLE IF NOT EXISTS PercentChange ("state_id" NUMBER, "percent_change" NUMBER)')
+    cur.execute('CREATE INDEX IF NOT EXISTS PercentChange_state ON PercentChange (state_id)')
     conn.commit()
 
-def percent_change_table(cur, conn, state_id, percent):
+def covid_table(cur, conn, state, date, positive, writer=None):
     #STATE MUST BE LOWERCASE
     '''This function takes in cursor and connection variables to database, state,
-    and percent change calculated from percent_change. It creates a table in the database
-    if it doesn't exist and inserts the state and percent change. Returns nothing.'''
+    date, and number of positive COVID cases for that state, and an optional BulkWriter. It inserts the state,
+    date, and number of positive cases, either right away or buffered in the writer. The table must already
+    exist (see create_covid_tables). Returns nothing.'''
 
-    cur.execute('CREATE TABLE IF NOT EXISTS PercentChange ("state_id" NUMBER, "percent_change" NUMBER)')
-    cur.execute('INSERT INTO PercentChange (state_id, percent_change) VALUES (?, ?)', (state_id, percent))
+    if writer is not None:
+        writer.add((state, date, positive))
+        return
+    cur.execute(COVID_INSERT, (state, date, positive))
     conn.commit()
+    instrument.count('rows_written')
+    instrument.count('commits')
 
-def covid_table_length(cur, conn):
-    '''This function calculates the number of rows in the CovidData table to help with extracting
-    25 lines at a time. Returns the number of rows in the table as an int.'''
-    cur.execute('CREATE TABLE IF NOT EXISTS CovidData ("id" INTEGER PRIMARY KEY, "state_id" TEXT, "date_id" NUMBER, "number_of_cases" NUMBER)')
-    cur.execute('SELECT MAX(id) FROM CovidData')
-    data = cur.fetchone()
-    num = data[0]
-    return num
+def percent_change_table(cur, conn, rows):
+    '''This function takes in cursor and connection variables to database and a list of
+    (state_id, percent change) tuples calculated from percent_change. It replaces any earlier rows for
+    those states with the new ones in one transaction, so reruns don't pile up duplicates. Returns nothing.'''
+
+    cur.executemany('DELETE FROM PercentChange WHERE state_id = ?', [(row[0],) for row in rows])
+    cur.executemany('INSERT INTO PercentChange (state_id, percent_change) VALUES (?, ?)', rows)
+    conn.commit()
+
+def state_ids(cur):
+    '''Returns a dictionary with lowercase state abbreviation as key and state_id as value.'''
+    cur.execute('SELECT state, state_id FROM States')
+    return dict(cur.fetchall())
+
+def date_ids(cur):
+    '''Returns a dictionary with the date as a YYYYMMDD int as key and date_id as value.'''
+    cur.execute('SELECT date, date_id FROM Dates')
+    return {int(date): date_id for date, date_id in cur.fetchall()}
 
 ##################################################################
 
-def get_mar_data(cur, conn, state, state_id, date_id):
+def current_url(state, api=COVID_API):
+    '''Returns the COVID Tracking Project url with the latest data for the given state.'''
+    return f"{api}/states/{state}/current.json"
+
+def daily_url(state, api=COVID_API):
+    '''Returns the COVID Tracking Project url with the full daily history for the given state.'''
+    return f"{api}/states/{state}/daily.json"
+
+@instrument.timed('get_mar_data')
+def get_mar_data(cur, conn, state, state_id, date_id, curr_info=None, writer=None):
     '''This function takes in the cursor and connection variables, and the lowercase state abbreviation.
     It sends requests to COVID Tracking Project API for the latest data for the given state (mostly March 7th 2021, as that's when
-    the project ended). Uses json to extract date and number of positive cases. Calls covid_table to create and add to table.
-    Returns nothing.'''
+    the project ended), unless the already fetched json is passed in as curr_info. Uses json to extract date and number
+    of positive cases. Calls covid_table to create and add to table. Returns nothing.'''
     
-    url_2021 = f"https://api.covidtracking.com/v1/states/{state}/current.json"
-    req = requests.get(url_2021)
-    curr_info = json.loads(req.text)
+    if curr_info is None:
+        req = requests.get(current_url(state))
+        curr_info = json.loads(req.text)
 
     #extract date and positive cases
     curr_date = curr_info["date"]
@@ -109,132 +127,244 @@ def get_mar_data(cur, conn, state, state_id, date_id):
         print("2021 info not found")
 
     #add to table
-    covid_table(cur, conn, state_id, date_id, curr_positive)
-
-def get_dec_data(cur, conn, state, state_id, date_id):
+    covid_table(cur, conn, state_id, date_id, curr_positive, writer=writer)
+
+def stream_daily_records(target_dates):
+    '''Returns a parse function for fetch_json/fetch_all that streams daily.json off the socket and
+    stops reading as soon as all of target_dates are found. The parse function returns the list of
+    matching daily records.'''
+    def parse(chunks):
+        records = iter_json_array(chunks)
+        return list(find_dates(records, target_dates).values())
+    return parse
+
+def parse_daily_series(chunks):
+    '''Parse function for fetch_json/fetch_all that streams the whole of daily.json and keeps just the date and
+    number of positive cases of each day. Days without a positive count are skipped. Returns a list of
+    (date, positive) tuples, newest first.'''
+    return [(record["date"], record["positive"]) for record in iter_json_array(chunks) if record.get("positive") is not None]
+
+@instrument.timed('get_dec_data')
+def get_dec_data(cur, conn, state, state_id, date_id, curr_info=None, target_date=DEC_DATE, writer=None):
     '''This function takes in the cursor and connection variables, and the lowercase state abbreviation.
-    It sends requests to COVID Tracking Project API for Dec 1st, 2020 data for the given state.
-    Uses json to extract date and number of positive cases. Calls covid_table to create and add to table.
-    Returns nothing.'''
-    url = f"https://api.covidtracking.com/v1/states/{state}/daily.json"
-    req = requests.get(url)
-    curr_info = json.loads(req.text)
-    curr_info.reverse()
-
-    dec_1_2020 = 20201201
+    It streams the COVID Tracking Project daily history for the given state until it reaches target_date
+    (Dec 1st, 2020 by default), unless already fetched daily records are passed in as curr_info. Extracts the
+    number of positive cases. Calls covid_table to create and add to table. Returns nothing.'''
+    if curr_info is None:
+        session = make_session(1)
+        curr_info = fetch_json(session, daily_url(state), parse=stream_daily_records([target_date]))
+
     positive = 0
 
     #extract positive cases
-    for day in curr_info:
-        if day["date"] == dec_1_2020:
-            positive = day["positive"]
+    found = find_dates(curr_info, [target_date])
+    if target_date in found:
+        positive = found[target_date]["positive"]
 
     if positive == 'null':
         print("Jul info not found")
 
     #add to table
-    covid_table(cur, conn, state_id, date_id, positive)
-
-def percent_change(cur, conn, states_list):
-    '''This function takes in cursor and connection variables, and the lowercase state abbreviation.
-    It calculates the percent change from Dec 2020 to Mar 2021 in number of COVID cases for the given state.
-    Returns a list with all the percent changes.'''
-    
-    #JOIN HERE
-    cur.execute('SELECT States.state, Dates.date, CovidData.number_of_cases FROM CovidData JOIN States JOIN Dates ON CovidData.state_id = States.state_id and CovidData.date_id = Dates.date_id')
-    cases = cur.fetchall()
+    covid_table(cur, conn, state_id, date_id, positive, writer=writer)
+
+@instrument.timed('fetch_covid_batch')
+def fetch_covid_batch(batch, state_ids, date_ids, max_workers=10, rate_per_host=None, cache=None, api=COVID_API):
+    '''This function takes in a list of (state, date) units, the state_ids and date_ids dictionaries, the fetch
+    settings, an optional HttpCache and the API base url. MAR_DATE units are read from current.json and every other date is streamed out of daily.json, with
+    all states in the batch fetched concurrently. Returns a list of (unit, CovidData row) pairs for run_ingest;
+    units whose state couldn't be fetched or whose date isn't in the history are left out.'''
+    daily_dates = {}
+    current_states = []
+    for state, date in batch:
+        if date == MAR_DATE:
+            current_states.append(state)
+        else:
+            daily_dates.setdefault(state, []).append(date)
+
+    fetched = []
+
+    if daily_dates:
+        targets = set(date for dates in daily_dates.values() for date in dates)
+        urls = [daily_url(state, api) for state in daily_dates]
+        responses = fetch_all(urls, max_workers=max_workers, rate_per_host=rate_per_host, parse=stream_daily_records(targets), cache=cache)
+        for state, url in zip(daily_dates, urls):
+            if responses[url] is None:
+                continue
+            found = find_dates(responses[url], daily_dates[state])
+            for date in daily_dates[state]:
+                if date not in found:
+                    print(f"{date} info not found for {state}")
+                    continue
+                fetched.append(((state, date), (state_ids[state], date_ids[date], found[date]["positive"])))
+
+    if current_states:
+        urls = [current_url(state, api) for state in current_states]
+        responses = fetch_all(urls, max_workers=max_workers, rate_per_host=rate_per_host, cache=cache)
+        for state, url in zip(current_states, urls):
+            if responses[url] is None:
+                continue
+            fetched.append(((state, MAR_DATE), (state_ids[state], date_ids[MAR_DATE], responses[url]["positive"])))
+
+    return fetched
+
+@instrument.timed('fetch_series_batch')
+def fetch_series_batch(cur, conn, batch, state_ids, max_workers=10, rate_per_host=None, cache=None, api=COVID_API):
+    '''This function takes in the cur and conn variables, a list of (state, 'series') units, the state_ids dictionary,
+    the fetch settings, an optional HttpCache and the API base url. Each state's daily.json is fetched once, concurrently, and every
+    day in it is kept. New dates are added to Dates first. Returns a list of (unit, list of CovidData rows) pairs
+    for run_ingest with many=True; states that couldn't be fetched are left out.'''
+    urls = [daily_url(state, api) for state, period in batch]
+    responses = fetch_all(urls, max_workers=max_workers, rate_per_host=rate_per_host, parse=parse_daily_series, cache=cache)
+
+    add_dates(cur, conn, [date for url in urls if responses[url] for date, positive in responses[url]])
+    ids_by_date = date_ids(cur)
+
+    fetched = []
+    for unit, url in zip(batch, urls):
+        if responses[url] is None:
+            continue
+        state_id = state_ids[unit[0]]
+        fetched.append((unit, [(state_id, ids_by_date[date], positive) for date, positive in responses[url]]))
+    return fetched
+
+def last_stored_dates(cur):
+    '''Returns a dictionary with every registered state's abbreviation as key and the newest date it has in
+    CovidData, as a YYYYMMDD int, as value (None for a state with no rows yet).'''
+    cur.execute('SELECT States.state, (SELECT MAX(Dates.date) FROM CovidData JOIN Dates ON CovidData.date_id = Dates.date_id '
+                'WHERE CovidData.state_id = States.state_id) FROM States ORDER BY States.state_id')
+    return {state: int(date) if date is not None else None for state, date in cur.fetchall()}
+
+def stream_daily_since(last_date):
+    '''Returns a parse function for fetch_json/fetch_all that streams daily.json, which is newest first, and stops
+    at the first day on or before last_date (reads everything if last_date is None). The parse function returns
+    a list of (date, positive) tuples for the newer days, skipping days without a positive count.'''
+    def parse(chunks):
+        days = []
+        for record in iter_json_array(chunks):
+            if last_date is not None and record["date"] <= last_date:
+                break
+            if record.get("positive") is not None:
+                days.append((record["date"], record["positive"]))
+        return days
+    return parse
+
+@instrument.timed('fetch_new_days')
+def fetch_new_days(cur, conn, state_ids, max_workers=10, rate_per_host=None, cache=None, api=COVID_API):
+    '''This function takes in the cur and conn variables, the state_ids dictionary, the fetch settings, an optional
+    HttpCache and the API base url. For every state it streams daily.json only as far back as the newest date
+    already stored, fetching states that share that date concurrently. New dates are added to Dates first.
+    Returns a list of CovidData rows for the new days and the list of states that couldn't be fetched.'''
+    by_last_date = {}
+    for state, last_date in last_stored_dates(cur).items():
+        if state in state_ids:
+            by_last_date.setdefault(last_date, []).append(state)
+
+    fetched = []
+    failed = []
+    for last_date, states in by_last_date.items():
+        urls = [daily_url(state, api) for state in states]
+        responses = fetch_all(urls, max_workers=max_workers, rate_per_host=rate_per_host, parse=stream_daily_since(last_date), cache=cache)
+        for state, url in zip(states, urls):
+            if responses[url] is None:
+                failed.append(state)
+            else:
+                fetched.append((state, responses[url]))
+
+    add_dates(cur, conn, [date for state, days in fetched for date, positive in days])
+    ids_by_date = date_ids(cur)
+    rows = [(state_ids[state], ids_by_date[date], positive) for state, days in fetched for date, positive in days]
+    return rows, failed
+
+def percent_change(cur, conn, states_list=None, start=DEC_DATE, end=MAR_DATE):
+    '''This function takes in cursor and connection variables, a list of lowercase region abbreviations (every
+    registered region if None) and the two YYYYMMDD dates to compare (Dec 1 2020 and Mar 7 2021 by default). It
+    calculates the percent change in number of COVID cases for every region at once with compute_changes and
+    writes them all to PercentChange in one go. Returns a list with the percent changes in the same order as
+    states_list, with None for a region that doesn't have cases on both dates.'''
+    if states_list is None:
+        states_list = region_list(cur)
+
+    changes = compute_changes(cur, dates=[start, end])
+    by_state = {row[1]: row for row in changes}
 
     percent_list = []
-
-    i = 1
+    rows = []
     for state in states_list:
-        cases_list = []
-        for row in cases:
-            if row[0] == state:
-                cases_list.append(row[2])
-        positive_dec = cases_list[0]
-        positive_mar = cases_list[1]
-    
-        percent = (positive_mar - positive_dec) / positive_dec * 100
-        percent_change_table(cur, conn, i, percent)
-
+        if state not in by_state:
+            percent_list.append(None)
+            continue
+        state_id = by_state[state][0]
+        percent = by_state[state][7]
+        rows.append((state_id, percent))
         percent_list.append(percent)
-        i += 1
-    
-    return percent_list
-
-def write_to_file(filename, cur, conn, states_list):
-    '''Takes in a filename, cur and conn variables, and a list of state abbreviations.
-    Writes to a csv file the column headers and values of state abbreviations and percent
-    change in COVID cases as calculated in percent_change().'''
-    path = os.path.dirname(os.path.abspath(__file__)) + os.sep
-    write_file = open(path + filename, "w")
-    write = csv.writer(write_file, delimiter=",")
-    write.writerow(('State','Percent Change COVID Cases'))
-
-    percent_list = percent_change(cur, conn, states_list)
-
-    for i in range(50):
-        values = [states_list[i], percent_list[i]]
-        write.writerow(values)
 
-    write_file.close()
+    percent_change_table(cur, conn, rows)
+    return percent_list
 
-def main():
-    '''Main includes two state abbreviation lists with 25 states in each. It calls covid_table_length() and
-    uses the results to determine what set of data to collect, storing 25 rows each time until CovidData is
-    populated with 100 rows. Then calculates and populates PercentChange, and writes calculations to csv file.
-    Returns nothing.'''
+@instrument.timed('write_to_file')
+def write_to_file(filename, cur, conn, states_list=None, start=DEC_DATE, end=MAR_DATE):
+    '''Takes in a filename, cur and conn variables, a list of region abbreviations (all of them if None) and the two dates to compare.
+    Calculates the percent changes with percent_change() and streams the PercentChange table, state abbreviation
+    and percent change in COVID cases, to the file next to the scripts. The extension of filename picks the
+    format (.csv, .npy, or .arrow/.parquet with pyarrow). Returns the number of rows written.'''
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    percent_change(cur, conn, states_list, start, end)
+    return export(cur, 'percent_change', path)
+
+def main(batch_size=25, offline=False, series=False, start=DEC_DATE, end=MAR_DATE, regions='states'):
+    '''Main works out which (state, date) units are missing from CovidData using the IngestCheckpoint table and
+    fetches just those, batch_size states at a time, so a single run loads everything and an interrupted run
+    can be restarted safely. With series=True every day of each state's daily.json is loaded instead, one
+    (state, 'series') unit per state. Responses go through the on-disk HttpCache; with offline=True only cached
+    responses are used. Once every unit is loaded it calculates and populates PercentChange between start and end,
+    and writes calculations to csv file. regions picks what is registered and loaded: 'states', 'all' (adds DC and
+    the territories) or a csv file of regions, see states.read_regions. Returns nothing.'''
     cur, conn = setUpDatabase("finalProject.db")
 
-    state_table(cur, conn)
+    state_table(cur, conn, regions_for(regions))
     date_table(cur, conn)
-
-    states_list_1 = ['al', 'ak', 'az', 'ar', 'ca', 'co', 'ct', 'de', 'fl', 'ga', 'hi', 'id', 'il', 'in', 'ia', 'ks', 'ky', 'la', 'me', 'md', 'ma', 'mi', 'mn', 'ms', 'mo']
-    states_list_2 = ['mt', 'ne', 'nv', 'nh', 'nj', 'nm', 'ny', 'nc', 'nd', 'oh', 'ok', 'or', 'pa', 'ri', 'sc', 'sd', 'tn', 'tx', 'ut', 'vt', 'va', 'wa', 'wv', 'wi', 'wy']
-    full_states_list = ['al', 'ak', 'az', 'ar', 'ca', 'co', 'ct', 'de', 'fl', 'ga', 'hi', 'id', 'il', 'in', 'ia', 'ks', 'ky', 'la', 'me', 'md', 'ma', 'mi', 'mn', 'ms', 'mo', 'mt', 'ne', 'nv', 'nh', 'nj', 'nm', 'ny', 'nc', 'nd', 'oh', 'ok', 'or', 'pa', 'ri', 'sc', 'sd', 'tn', 'tx', 'ut', 'vt', 'va', 'wa', 'wv', 'wi', 'wy']
-
-    num = covid_table_length(cur, conn)
-    if num == None:
-        print("1")
-        state_id = 1
-        date_id = 1
-        for state in states_list_1:
-            get_dec_data(cur, conn, state, state_id, date_id)
-            state_id += 1
+    create_covid_tables(cur, conn)
+    ensure_indexes(cur, conn)
+    create_summary_tables(cur, conn)
+    create_checkpoint_table(cur, conn)
+    seed_checkpoints(cur, conn, 'covid', 'SELECT States.state, Dates.date FROM CovidData JOIN States ON CovidData.state_id = States.state_id JOIN Dates ON CovidData.date_id = Dates.date_id')
+
+    full_states_list = region_list(cur)
+
+    ids_by_state = state_ids(cur)
+    cache = HttpCache(offline=offline)
+    if series:
+        units = [(state, 'series') for state in full_states_list]
+        fetch_batch = lambda batch: fetch_series_batch(cur, conn, batch, ids_by_state, cache=cache)
+        remaining = run_ingest(cur, conn, 'covid_series', units, fetch_batch, COVID_SERIES_INSERT, batch_size, many=True)
+    else:
+        units = [(state, date) for date in (DEC_DATE, MAR_DATE) for state in full_states_list]
+        ids_by_date = date_ids(cur)
+        fetch_batch = lambda batch: fetch_covid_batch(batch, ids_by_state, ids_by_date, cache=cache)
+        remaining = run_ingest(cur, conn, 'covid', units, fetch_batch, COVID_INSERT, batch_size)
+    cache.report()
+    cache.close()
+    with instrument.stage('refresh_summary'):
+        print(f"refreshed the summary for {refresh_summary(cur, conn, start, end)} states")
+    if remaining:
+        print(f"{remaining} units still missing, run again to retry them")
         return
 
-    elif type(num) == int:
-        if num <= 25:
-            print("2")
-            state_id = 26
-            date_id = 1
-            for state in states_list_2:
-                get_dec_data(cur, conn, state, state_id, date_id)
-                state_id += 1
-            return
-
-        if num <= 50:
-            print("3")
-            state_id = 1
-            date_id = 2
-            for state in states_list_1:
-                get_mar_data(cur, conn, state, state_id, date_id)
-                state_id += 1
-            return
-    
-        if num <= 75:
-            print("4")
-            state_id = 26
-            date_id = 2
-            for state in states_list_2:
-                get_mar_data(cur, conn, state, state_id, date_id)
-                state_id += 1
-
     print("percent calculation")
-    write_to_file('covid_calculations.csv', cur, conn, full_states_list)
+    write_to_file('covid_calculations.csv', cur, conn, full_states_list, start, end)
 
     cur.close()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Load COVID case counts into finalProject.db')
+    parser.add_argument('--batch-size', type=int, default=25, help='states fetched per batch')
+    parser.add_argument('--offline', action='store_true', help='only use responses already in the cache')
+    parser.add_argument('--series', action='store_true', help="load every day of each state's history, not just the two dates")
+    parser.add_argument('--start', type=int, default=DEC_DATE, help='first date (YYYYMMDD) of the percent change window')
+    parser.add_argument('--end', type=int, default=MAR_DATE, help='last date (YYYYMMDD) of the percent change window')
+    parser.add_argument('--regions', default='states', help="'states', 'all' (adds DC and the territories) or a csv file of abbreviation,name,fips")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    report_path = instrument.start_from_args(args)
+    main(args.batch_size, args.offline, args.series, args.start, args.end, args.regions)
+    instrument.finish_from_args(report_path)
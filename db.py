@@ -0,0 +1,67 @@
+import os
+import sqlite3
+
+from analytic_cache import clear_caches
+from bulk_insert import apply_pragmas
+
+#
+# Shared data access for covid_data.py, population_data.py and viz.py.
+# setUpDatabase hands out one configured connection per database per
+# process instead of every script opening its own, so the pragmas are
+# set once and sqlite3's prepared statement cache lives as long as the
+# process does. viz.py asks for a read-only connection.
+#
+
+DB_NAME = 'finalProject.db'
+STATEMENT_CACHE_SIZE = 256
+
+# cache_size is negative for KiB, so 64 MB of page cache and 256 MB of memory-mapped reads
+PRAGMAS = {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'cache_size': -64 * 1024, 'mmap_size': 256 * 1024 * 1024}
+READ_ONLY_PRAGMAS = {'cache_size': -64 * 1024, 'mmap_size': 256 * 1024 * 1024}
+
+connections = {}
+
+
+def database_path(db_name=DB_NAME):
+    '''Returns the full path of a database file kept next to the scripts.'''
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), db_name)
+
+
+def open_connection(db_name=DB_NAME, readonly=False, timeout=5.0):
+    '''Opens and configures a new connection to a database next to the scripts, for code that needs one of its
+    own, like a worker thread (sqlite3 connections can't be shared across threads). timeout is how long a write
+    waits for another connection's write to finish. Returns the connection.'''
+    path = database_path(db_name)
+    if readonly:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, timeout=timeout, cached_statements=STATEMENT_CACHE_SIZE)
+        apply_pragmas(conn, READ_ONLY_PRAGMAS)
+    else:
+        conn = sqlite3.connect(path, timeout=timeout, cached_statements=STATEMENT_CACHE_SIZE)
+        apply_pragmas(conn, PRAGMAS)
+    return conn
+
+
+def get_connection(db_name=DB_NAME, readonly=False):
+    '''This function takes in the name of the database and whether the connection should be read-only. Returns
+    this process's connection for that database and mode, opening and configuring it on first use. Read-only
+    connections are opened with mode=ro so nothing on them can write to the file.'''
+    key = (os.getpid(), db_name, readonly)
+    conn = connections.get(key)
+    if conn is None:
+        conn = connections[key] = open_connection(db_name, readonly)
+    return conn
+
+
+def setUpDatabase(db_name=DB_NAME, readonly=False):
+    '''This function takes in the name of the database and whether the connection should be read-only, and
+    returns cur and conn as the cursor and connection variable to allow database access. Every call in the
+    same process gets a new cursor on the same shared connection.'''
+    conn = get_connection(db_name, readonly)
+    return conn.cursor(), conn
+
+
+def close_connections():
+    '''Closes every connection this process has opened and drops their analytic caches. Returns nothing.'''
+    clear_caches()
+    for key in [key for key in connections if key[0] == os.getpid()]:
+        connections.pop(key).close()
@@ -0,0 +1,79 @@
+#
+# Downsampling for long time series, so a chart gets about as many points as
+# it has pixels across no matter how many rows are behind it. lttb takes a
+# function returning a fresh iterator of (x, y) points, such as a function
+# that re-runs a query and returns the cursor, plus the number of points, and
+# never holds more than a few values per output bucket.
+#
+# lttb (Largest-Triangle-Three-Buckets) keeps the one point per bucket that
+# best preserves the shape of the line. It reads the points twice: once for
+# each bucket's average, once to pick the points.
+#
+
+
+def bucket_bounds(count, buckets):
+    '''Returns a function mapping the index of a point (1 to count - 2, the first and last point stand alone) to its
+    bucket, when those points are split into buckets evenly sized buckets the way LTTB splits them.'''
+    every = (count - 2) / buckets
+
+    def bucket_of(i):
+        #bucket b starts at int(b * every) + 1, the division can land one bucket off either way
+        bucket = min(int((i - 1) / every), buckets - 1)
+        if bucket + 1 < buckets and i >= int((bucket + 1) * every) + 1:
+            bucket += 1
+        elif bucket > 0 and i < int(bucket * every) + 1:
+            bucket -= 1
+        return bucket
+    return bucket_of
+
+
+def lttb(make_points, count, threshold):
+    '''This function takes in a function returning an iterator of (x, y) points ordered by x with numeric x and y,
+    how many points it yields and the number of points wanted. Returns a list of threshold points chosen with
+    Largest-Triangle-Three-Buckets, always keeping the first and last point. Returns every point when there are
+    no more than threshold of them.'''
+    if threshold >= count or threshold < 3:
+        return list(make_points())
+    buckets = threshold - 2
+    bucket_of = bucket_bounds(count, buckets)
+
+    #first pass: the average point of every bucket
+    sums_x = [0.0] * buckets
+    sums_y = [0.0] * buckets
+    sizes = [0] * buckets
+    last = None
+    for i, point in enumerate(make_points()):
+        if 0 < i < count - 1:
+            bucket = bucket_of(i)
+            sums_x[bucket] += point[0]
+            sums_y[bucket] += point[1]
+            sizes[bucket] += 1
+        last = point
+    averages = [(sums_x[b] / sizes[b], sums_y[b] / sizes[b]) if sizes[b] else None for b in range(buckets)]
+
+    #second pass: in each bucket keep the point making the largest triangle with the point kept before it
+    #and the next bucket's average (the last point, for the last bucket)
+    kept = []
+    best = None
+    best_area = -1.0
+    current = 0
+    for i, point in enumerate(make_points()):
+        if i == 0:
+            kept.append(point)
+            continue
+        if i == count - 1:
+            break
+        bucket = bucket_of(i)
+        if bucket != current:
+            if best is not None:
+                kept.append(best)
+            best, best_area, current = None, -1.0, bucket
+        anchor = kept[-1]
+        following = averages[bucket + 1] if bucket + 1 < buckets and averages[bucket + 1] is not None else last
+        area = abs((anchor[0] - following[0]) * (point[1] - anchor[1]) - (anchor[0] - point[0]) * (following[1] - anchor[1]))
+        if area > best_area:
+            best, best_area = point, area
+    if best is not None:
+        kept.append(best)
+    kept.append(last)
+    return kept
@@ -0,0 +1,252 @@
+import argparse
+import ast
+import csv
+import importlib
+import os
+import struct
+
+from db import setUpDatabase
+from metrics import METRICS_SQL, metrics_params
+
+#
+# Streams query results to a file chunk_size rows at a time, so exporting
+# a long time series never holds more than one chunk in memory. The format
+# comes from the file extension: .csv, .npy (a structured array written by
+# hand, readable with numpy.load(path, mmap_mode='r')), and .arrow/.feather
+# or .parquet when pyarrow is installed. pyarrow is only imported by the
+# writers that need it, so the ingest scripts importing this module don't
+# pay for it.
+#
+
+CHUNK_SIZE = 10000
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+# room for the header with any row count, since the count is only known once the rows are written
+NPY_SHAPE_WIDTH = 20
+
+EXPORTS = {
+    'cases': '''SELECT States.state AS state, CAST(Dates.date AS INTEGER) AS date, CovidData.number_of_cases AS cases
+        FROM CovidData
+        JOIN States ON States.state_id = CovidData.state_id
+        JOIN Dates ON Dates.date_id = CovidData.date_id
+        ORDER BY CovidData.state_id, Dates.date''',
+    'percent_change': '''SELECT States.state AS "State", PercentChange.percent_change AS "Percent Change COVID Cases"
+        FROM PercentChange
+        JOIN States ON States.state_id = PercentChange.state_id
+        ORDER BY PercentChange.state_id''',
+    'population': '''SELECT States.state AS state, p2010.population AS population_2010, p2020.population AS population_2020,
+            p2020.population * 1.0 / p2010.population AS change
+        FROM Population AS p2010
+        JOIN Population AS p2020 ON p2020.state_id = p2010.state_id AND p2020.year = 2020
+        JOIN States ON States.state_id = p2010.state_id
+        WHERE p2010.year = 2010
+        ORDER BY p2010.state_id''',
+    'metrics': METRICS_SQL,
+}
+
+# parameters for the EXPORTS queries that take some
+EXPORT_PARAMS = {
+    'metrics': metrics_params(),
+}
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def column_names(cur, sql, params=()):
+    '''Returns the column names of a query without fetching any of its rows.'''
+    cur.execute(f'SELECT * FROM ({sql}) LIMIT 0', params)
+    names = [column[0] for column in cur.description]
+    if len(set(names)) != len(names):
+        raise ValueError(f"export columns need unique names, got {names}")
+    return names
+
+
+def column_types(cur, sql, params=()):
+    '''This function takes in the cursor and a query. In one pass inside SQLite it finds, for every column, whether
+    any value is text, real or NULL and the longest text. Returns a list of (name, kind, width) tuples where kind is
+    'text', 'real' or 'integer'; integer columns with NULLs come back as 'real' so the NULLs can be NaN.'''
+    names = column_names(cur, sql, params)
+    checks = []
+    for name in names:
+        col = quote(name)
+        checks.append(f"MAX(typeof({col}) = 'text'), MAX(typeof({col}) = 'real' OR typeof({col}) = 'null'), MAX(LENGTH({col}))")
+    cur.execute(f"SELECT {', '.join(checks)} FROM ({sql})", params)
+    stats = cur.fetchone()
+
+    types = []
+    for i, name in enumerate(names):
+        is_text, is_real, width = stats[i * 3:i * 3 + 3]
+        if is_text:
+            types.append((name, 'text', max(1, width or 1)))
+        elif is_real:
+            types.append((name, 'real', 8))
+        else:
+            types.append((name, 'integer', 8))
+    return types
+
+
+def iter_chunks(cur, sql, params=(), chunk_size=CHUNK_SIZE):
+    '''Runs the query and yields its rows chunk_size at a time.'''
+    cur.execute(sql, params)
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield rows
+
+
+def write_csv(cur, sql, params, path, chunk_size):
+    with open(path, 'w', newline='') as f:
+        write = csv.writer(f, delimiter=',')
+        write.writerow(column_names(cur, sql, params))
+        count = 0
+        for rows in iter_chunks(cur, sql, params, chunk_size):
+            write.writerows(rows)
+            count += len(rows)
+    return count
+
+
+def npy_header(types, count):
+    '''Returns the .npy version 1.0 header for a structured array of count rows, padded to a fixed size.'''
+    descr = []
+    for name, kind, width in types:
+        descr.append((name, {'text': f'<U{width}', 'real': '<f8', 'integer': '<i8'}[kind]))
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%s,), }" % (descr, str(count).rjust(NPY_SHAPE_WIDTH))
+    #magic + 2 byte length + header + newline, padded with spaces to a multiple of 64 bytes
+    padding = -(len(NPY_MAGIC) + 2 + len(header) + 1) % 64
+    header = (header + ' ' * padding + '\n').encode('latin1')
+    return NPY_MAGIC + struct.pack('<H', len(header)) + header
+
+
+def npy_packer(types):
+    '''Returns a function that turns one row into the bytes of one .npy record.'''
+    fmt = '<' + ''.join({'text': f'{width * 4}s', 'real': 'd', 'integer': 'q'}[kind] for name, kind, width in types)
+    pack = struct.Struct(fmt).pack
+    texts = [i for i, (name, kind, width) in enumerate(types) if kind == 'text']
+    reals = [i for i, (name, kind, width) in enumerate(types) if kind == 'real']
+
+    def pack_row(row):
+        row = list(row)
+        for i in texts:
+            row[i] = ('' if row[i] is None else str(row[i])).encode('utf-32-le')
+        for i in reals:
+            row[i] = float('nan') if row[i] is None else row[i]
+        return pack(*row)
+    return pack_row
+
+
+def write_npy(cur, sql, params, path, chunk_size):
+    types = column_types(cur, sql, params)
+    pack_row = npy_packer(types)
+    count = 0
+    with open(path, 'wb') as f:
+        f.write(npy_header(types, 0))
+        for rows in iter_chunks(cur, sql, params, chunk_size):
+            f.write(b''.join([pack_row(row) for row in rows]))
+            count += len(rows)
+        #the header has a fixed size, so the real row count can be written over the placeholder
+        f.seek(0)
+        f.write(npy_header(types, count))
+    return count
+
+
+def load_pyarrow(extension, writer):
+    '''Imports pyarrow and the named writer module (ipc or parquet) the first time an export needs them. Returns
+    the pyarrow module. Raises ValueError if pyarrow isn't installed.'''
+    try:
+        importlib.import_module(f'pyarrow.{writer}')
+    except ImportError:
+        raise ValueError(f"exporting to {extension} needs pyarrow, use .npy or .csv instead")
+    return importlib.import_module('pyarrow')
+
+
+def arrow_schema(pyarrow, types):
+    kinds = {'text': pyarrow.string(), 'real': pyarrow.float64(), 'integer': pyarrow.int64()}
+    return pyarrow.schema([(name, kinds[kind]) for name, kind, width in types])
+
+
+def arrow_batches(pyarrow, cur, sql, params, schema, chunk_size):
+    for rows in iter_chunks(cur, sql, params, chunk_size):
+        columns = list(zip(*rows))
+        yield pyarrow.RecordBatch.from_arrays([pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+
+
+def write_arrow(cur, sql, params, path, chunk_size):
+    pyarrow = load_pyarrow(os.path.splitext(path)[1], 'ipc')
+    schema = arrow_schema(pyarrow, column_types(cur, sql, params))
+    count = 0
+    with pyarrow.OSFile(path, 'wb') as sink, pyarrow.ipc.new_file(sink, schema) as writer:
+        for batch in arrow_batches(pyarrow, cur, sql, params, schema, chunk_size):
+            writer.write_batch(batch)
+            count += batch.num_rows
+    return count
+
+
+def write_parquet(cur, sql, params, path, chunk_size):
+    pyarrow = load_pyarrow('.parquet', 'parquet')
+    schema = arrow_schema(pyarrow, column_types(cur, sql, params))
+    count = 0
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for batch in arrow_batches(pyarrow, cur, sql, params, schema, chunk_size):
+            writer.write_batch(batch)
+            count += batch.num_rows
+    return count
+
+
+WRITERS = {
+    '.csv': write_csv,
+    '.npy': write_npy,
+    '.arrow': write_arrow,
+    '.feather': write_arrow,
+    '.parquet': write_parquet,
+}
+
+
+def export_query(cur, sql, path, params=(), chunk_size=CHUNK_SIZE):
+    '''This function takes in the cursor, a SELECT statement, the output path, the query parameters and the number
+    of rows to hold in memory at once. It streams the query result to path in the format given by the path's
+    extension. Raises ValueError for an unknown extension, or for .arrow/.feather/.parquet without pyarrow.
+    Returns the number of rows written.'''
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in WRITERS:
+        raise ValueError(f"can't export to {extension or path}, expected one of {sorted(WRITERS)}")
+    return WRITERS[extension](cur, sql, params, path, chunk_size)
+
+
+def export(cur, name, path, chunk_size=CHUNK_SIZE, params=None):
+    '''Exports one of the queries in EXPORTS by name to path, with its EXPORT_PARAMS unless params is given.
+    Returns the number of rows written.'''
+    if params is None:
+        params = EXPORT_PARAMS.get(name, ())
+    return export_query(cur, EXPORTS[name], path, params, chunk_size)
+
+
+def read_npy_header(path):
+    '''Returns the (descr, shape, data offset) of a .npy file written by write_npy, for reading it back without numpy.'''
+    with open(path, 'rb') as f:
+        if f.read(len(NPY_MAGIC)) != NPY_MAGIC:
+            raise ValueError(f"{path} is not a version 1.0 .npy file")
+        length = struct.unpack('<H', f.read(2))[0]
+        header = ast.literal_eval(f.read(length).decode('latin1'))
+    return header['descr'], header['shape'], len(NPY_MAGIC) + 2 + length
+
+
+def main(name, path, chunk_size=CHUNK_SIZE, start=None, end=None):
+    '''Exports one of the EXPORTS queries from finalProject.db to path. start and end change the dates of the metrics export.'''
+    cur, conn = setUpDatabase("finalProject.db", readonly=True)
+    params = None
+    if name == 'metrics' and (start or end):
+        params = metrics_params(start or EXPORT_PARAMS['metrics']['start_date'], end or EXPORT_PARAMS['metrics']['end_date'])
+    print(f"wrote {export(cur, name, path, chunk_size, params)} rows to {path}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export tables from finalProject.db to csv, npy, arrow or parquet')
+    parser.add_argument('name', choices=sorted(EXPORTS), help='what to export')
+    parser.add_argument('path', help='output file; the extension picks the format')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='rows held in memory at once')
+    parser.add_argument('--start', help='first date (YYYYMMDD) for the metrics export')
+    parser.add_argument('--end', help='last date (YYYYMMDD) for the metrics export')
+    args = parser.parse_args()
+    main(args.name, args.path, args.chunk_size, args.start, args.end)
@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import instrument
+from http_cache import CacheMiss
+from json_stream import CHUNK_SIZE
+
+#
+# Concurrent fetch engine shared by covid_data.py and population_data.py.
+# Every request goes through one pooled requests.Session so connections
+# (and TLS handshakes) are reused across all of the state endpoints.
+#
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HostRateLimiter:
+    '''Keeps at most rate requests per second going to each host. Threads that would go
+    over the limit sleep until their slot comes up.'''
+
+    def __init__(self, rate=None):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.next_slot = {}
+
+    def wait(self, url):
+        if not self.rate:
+            return
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + 1.0 / self.rate
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def make_session(pool_size=10):
+    '''This function takes in the number of connections to keep open per host and returns a
+    requests.Session whose connection pool is big enough for that many worker threads.'''
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+@instrument.timed('fetch_json')
+def timed_parse(parse):
+    '''Wraps a parse function so only the time spent inside it is recorded as the 'json_parse' stage, not the
+    cache lookup or the request around it. Like the uncached stream, that includes waiting for chunks, which
+    instrument.metered also records as 'network'.'''
+    def timed(chunks):
+        with instrument.stage('json_parse'):
+            return parse(chunks)
+    return timed
+
+
+def fetch_json(session, url, limiter=None, retries=3, backoff=0.5, timeout=30, parse=None, cache=None):
+    '''This function takes in a session, a url, an optional HostRateLimiter and the retry settings.
+    It GETs the url, retrying connection errors and retryable status codes with exponential
+    backoff (backoff, 2*backoff, 4*backoff ...). Returns the decoded json, or if a parse function
+    is given, the body is streamed and whatever parse(chunks) returns for the iterator of byte chunks.
+    With an HttpCache the body comes from (and is saved to) the cache; a streamed body that parse stops reading
+    early isn't saved, so the early stop still saves the rest of the download.'''
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.wait(url)
+        try:
+            if cache is not None:
+                if parse is not None:
+                    return cache.get_streamed(session, url, timed_parse(parse), timeout)
+                body = cache.get(session, url, timeout)
+                with instrument.stage('json_parse'):
+                    return json.loads(body)
+
+            instrument.count('requests')
+            with session.get(url, timeout=timeout, stream=parse is not None) as resp:
+                if resp.status_code not in RETRY_STATUSES:
+                    resp.raise_for_status()
+                    #for a streamed body this includes the time waiting on the network, which is also recorded as 'network'
+                    with instrument.stage('json_parse'):
+                        if parse is not None:
+                            return parse(instrument.metered(resp.iter_content(chunk_size=CHUNK_SIZE)))
+                        instrument.count('bytes', len(resp.content))
+                        return resp.json()
+            error = requests.HTTPError(f"{resp.status_code} for {url}", response=resp)
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code not in RETRY_STATUSES:
+                raise
+            error = e
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+
+        if attempt >= retries:
+            raise error
+        instrument.count('retries')
+        time.sleep(backoff * (2 ** attempt))
+        attempt += 1
+
+
+def fetch_all(urls, max_workers=10, rate_per_host=None, retries=3, backoff=0.5, session=None, parse=None, cache=None):
+    '''This function takes in a list of urls and the concurrency settings. It fetches every url at
+    once on a bounded thread pool that shares a single pooled session, and returns a dictionary
+    with url as key and decoded json (or the result of parse, see fetch_json) as value. An optional
+    HttpCache is shared by all the workers. A url that
+    still fails after all retries maps to None so one bad state doesn't throw away the rest of the batch.'''
+    own_session = session is None
+    if own_session:
+        session = make_session(max_workers)
+    limiter = HostRateLimiter(rate_per_host)
+
+    def fetch_one(url):
+        try:
+            return fetch_json(session, url, limiter, retries, backoff, parse=parse, cache=cache)
+        except (requests.RequestException, ValueError, CacheMiss) as e:
+            print(f"failed to fetch {url}: {e!r}")
+            return None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = pool.map(fetch_one, urls)
+            return dict(zip(urls, results))
+    finally:
+        if own_session:
+            session.close()
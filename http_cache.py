@@ -0,0 +1,171 @@
+import os
+import sqlite3
+import threading
+import time
+
+import instrument
+from json_stream import CHUNK_SIZE, iter_body_chunks
+
+#
+# On-disk HTTP response cache for the COVID Tracking and Wikipedia fetches.
+# Bodies live in a small SQLite file keyed by url. Fresh entries are served
+# without touching the network, stale ones are revalidated with
+# ETag/Last-Modified, and the least recently used entries are evicted once
+# the cache grows past max_bytes. get_streamed feeds a downloaded body to a
+# parser as it arrives, so a parser that stops early also stops the
+# download. Only a body that was read to the end is stored.
+#
+
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class CacheMiss(Exception):
+    '''Raised in offline mode when a url isn't in the cache.'''
+
+
+class HttpCache:
+    '''Response cache shared by every worker thread of a fetch. ttl is how many seconds an entry is served
+    without revalidating, max_bytes caps the total body size kept, and offline serves only what is already
+    cached (stale or not) and raises CacheMiss for anything else. Counters are kept in stats.'''
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES, offline=False):
+        if path is None:
+            path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'http_cache.db')
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'evicted': 0, 'partial': 0, 'bytes_downloaded': 0}
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS CacheEntry ("url" TEXT PRIMARY KEY, "body" BLOB, "etag" TEXT, '
+                          '"last_modified" TEXT, "fetched_at" REAL, "last_access" REAL, "size" INTEGER)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS CacheEntry_last_access ON CacheEntry (last_access)')
+        self.conn.commit()
+
+    def lookup(self, url):
+        with self.lock:
+            row = self.conn.execute('SELECT body, etag, last_modified, fetched_at FROM CacheEntry WHERE url = ?', (url,)).fetchone()
+            if row is not None:
+                with self.conn:
+                    self.conn.execute('UPDATE CacheEntry SET last_access = ? WHERE url = ?', (time.time(), url))
+            return row
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def store(self, url, body, etag, last_modified):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO CacheEntry (url, body, etag, last_modified, fetched_at, last_access, size) '
+                              'VALUES (?, ?, ?, ?, ?, ?, ?)', (url, body, etag, last_modified, now, now, len(body)))
+            #drop everything past max_bytes, counting from the most recently used entry
+            cur = self.conn.execute('DELETE FROM CacheEntry WHERE url IN (SELECT url FROM (SELECT url, SUM(size) OVER '
+                                    '(ORDER BY last_access DESC, url) AS running FROM CacheEntry) WHERE running > ?)',
+                                    (self.max_bytes,))
+            self.stats['evicted'] += cur.rowcount
+
+    def cached(self, url):
+        '''Returns the cache entry for url when it can be used without a request (fresh, or any entry in offline
+        mode) and None when a request is needed. Raises CacheMiss for an uncached url in offline mode.'''
+        entry = self.lookup(url)
+        if entry is not None and (self.offline or time.time() - entry[3] < self.ttl):
+            self.count('hits')
+            instrument.count('cache_hits')
+            return entry
+        if self.offline:
+            raise CacheMiss(url)
+        return None
+
+    def request(self, session, url, timeout, stream=False):
+        '''GETs url, conditionally when there is a stale entry to revalidate. Returns the cached body when the
+        server answers 304 Not Modified, otherwise the response after checking its status.'''
+        entry = self.lookup(url)
+        headers = {}
+        if entry is not None:
+            if entry[1]:
+                headers['If-None-Match'] = entry[1]
+            if entry[2]:
+                headers['If-Modified-Since'] = entry[2]
+
+        instrument.count('requests')
+        with instrument.stage('network'):
+            resp = session.get(url, headers=headers, timeout=timeout, stream=stream)
+        if resp.status_code == 304 and entry is not None:
+            resp.close()
+            with self.lock, self.conn:
+                self.conn.execute('UPDATE CacheEntry SET fetched_at = ? WHERE url = ?', (time.time(), url))
+            self.count('hits')
+            self.count('revalidated')
+            return entry[0]
+
+        try:
+            resp.raise_for_status()
+        except Exception:
+            resp.close()
+            raise
+        return resp
+
+    def get(self, session, url, timeout=30):
+        '''This function takes in a requests session, a url and the request timeout. Returns the response
+        body as bytes, from the cache when the entry is fresh (or in offline mode), after a conditional
+        request when it is stale, and from a normal GET otherwise. Raises requests.HTTPError for an
+        error status and CacheMiss for an uncached url in offline mode.'''
+        entry = self.cached(url)
+        if entry is not None:
+            return entry[0]
+        resp = self.request(session, url, timeout)
+        if isinstance(resp, bytes):
+            return resp
+
+        self.count('misses')
+        self.count('bytes_downloaded', len(resp.content))
+        instrument.count('bytes', len(resp.content))
+        self.store(url, resp.content, resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
+        return resp.content
+
+    def get_streamed(self, session, url, parse, timeout=30, chunk_size=CHUNK_SIZE):
+        '''This function takes in a requests session, a url, a parse function taking an iterator of byte chunks
+        and the request timeout. Returns what parse returns. A cached body is fed to parse in chunks; a downloaded
+        one is fed to it as it arrives, so if parse returns before the end only one more chunk is downloaded, to see
+        whether there was anything left. The body is only stored when it was read to the end. Raises like get.'''
+        entry = self.cached(url)
+        if entry is not None:
+            return parse(iter_body_chunks(entry[0], chunk_size))
+        resp = self.request(session, url, timeout, stream=True)
+        if isinstance(resp, bytes):
+            return parse(iter_body_chunks(resp, chunk_size))
+
+        chunks = []
+        finished = []
+
+        def read():
+            for chunk in instrument.metered(resp.iter_content(chunk_size=chunk_size)):
+                chunks.append(chunk)
+                yield chunk
+            finished.append(True)
+
+        reader = read()
+        with resp:
+            result = parse(reader)
+            #parse can stop at the closing bracket without asking for more, and Content-Length counts the compressed
+            #bytes of a gzip body, so one more read tells a finished body from an early stop (costing one chunk)
+            next(reader, None)
+        size = sum(len(chunk) for chunk in chunks)
+        self.count('misses')
+        self.count('bytes_downloaded', size)
+        if finished:
+            self.store(url, b''.join(chunks), resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
+        else:
+            #a partial body can't stand in for the whole one, any older entry is kept for revalidating
+            self.count('partial')
+        return result
+
+    def report(self):
+        '''Prints the hit/miss counters.'''
+        print(", ".join(f"{name}: {value}" for name, value in self.stats.items()))
+
+    def close(self):
+        self.conn.close()
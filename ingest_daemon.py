@@ -0,0 +1,234 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import time
+
+import covid_data as cd
+import population_data as pdm
+from bulk_insert import BulkWriter
+from db import DB_NAME, open_connection
+from http_cache import HttpCache
+from population_snapshots import create_snapshot_table, ingest_snapshots
+from queries import ensure_indexes
+from state_summary import create_summary_tables, refresh_summary
+
+#
+# Service mode: one asyncio event loop that refreshes each source on its own
+# schedule instead of someone re-running covid_data.py and
+# population_data.py by hand. The COVID refresh streams each state's
+# daily.json only back to the newest date already stored and commits the
+# new days batch_size rows at a time; the population refresh reloads the
+# snapshots whose page changed. Refreshes run on worker threads with their
+# own connection, and WAL lets viz.py and export.py keep reading meanwhile.
+#
+# After every refresh the status (lag, throughput and error counters per
+# source) is written to a JSON file, and is also served at
+# http://127.0.0.1:PORT/status with --status-port.
+#   python ingest_daemon.py --covid-every 3600 --status-port 8765
+#
+
+STATUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ingest_status.json')
+COVID_EVERY = 60 * 60
+POPULATION_EVERY = 24 * 60 * 60
+
+
+def refresh_covid(db_name=DB_NAME, batch_size=1000, cache=None, api=cd.COVID_API):
+    '''Runs on a worker thread. Loads the days newer than each state's last stored date, committing batch_size rows
+    per transaction, then refreshes StateSummary. Returns a dictionary with the 'rows' written, the number of
+    'commits', how many of the 'units' (states) 'failed' to fetch and the 'newest_date' now stored.'''
+    conn = open_connection(db_name, timeout=30)
+    cur = conn.cursor()
+    try:
+        cd.state_table(cur, conn)
+        cd.date_table(cur, conn)
+        cd.create_covid_tables(cur, conn)
+        ensure_indexes(cur, conn)
+        create_summary_tables(cur, conn)
+
+        ids = cd.state_ids(cur)
+        rows, failed = cd.fetch_new_days(cur, conn, ids, cache=cache, api=api)
+        with BulkWriter(conn, cd.COVID_SERIES_INSERT, batch_size) as writer:
+            writer.add_many(rows)
+        refresh_summary(cur, conn)
+
+        dates = [date for date in cd.last_stored_dates(cur).values() if date is not None]
+        return {'rows': writer.rows_written, 'commits': writer.commits, 'units': len(ids), 'failed': len(failed),
+                'newest_date': max(dates, default=None)}
+    finally:
+        conn.close()
+
+
+def refresh_population(db_name=DB_NAME, sources=(pdm.POP_URL,), workers=4, cache=None):
+    '''Runs on a worker thread. Reloads the population snapshots whose page changed and refreshes StateSummary.
+    Returns a dictionary with the 'rows' written, the number of 'commits' and how many of the 'units' (sources)
+    'failed'.'''
+    conn = open_connection(db_name, timeout=30)
+    cur = conn.cursor()
+    try:
+        cd.state_table(cur, conn)
+        pdm.migrate_population(cur, conn)
+        pdm.create_population_table(cur, conn)
+        create_summary_tables(cur, conn)
+        create_snapshot_table(cur, conn)
+
+        result = ingest_snapshots(cur, conn, list(sources), pdm.state_ids_by_name(cur), cache, workers=workers)
+        refresh_summary(cur, conn)
+        return {'rows': result['rows'], 'commits': result['loaded'], 'units': len(sources), 'failed': result['failed'],
+                'newest_date': None}
+    finally:
+        conn.close()
+
+
+def new_source_status(interval):
+    return {'interval_seconds': interval, 'runs': 0, 'errors': 0, 'consecutive_errors': 0, 'last_error': None,
+            'failed_units': 0, 'rows_total': 0, 'busy_seconds': 0.0, 'last_rows': 0, 'last_seconds': None,
+            'last_rows_per_second': None, 'last_started': None, 'last_success': None, 'next_run': None,
+            'newest_date': None}
+
+
+class IngestDaemon:
+    '''Runs every job on its own schedule. jobs maps a source name to (refresh function, interval in seconds); a
+    refresh function takes no arguments, runs on a worker thread and returns a dictionary like refresh_covid's.
+    The status of each source is kept in status and written to status_path after every refresh. A refresh where
+    some units failed doesn't count as a success for the lag, and one where every unit failed counts as an error.'''
+
+    def __init__(self, jobs, status_path=STATUS_FILE, status_port=None):
+        self.jobs = jobs
+        self.status_path = status_path
+        self.status_port = status_port
+        self.started = time.time()
+        self.sources = {name: new_source_status(interval) for name, (refresh, interval) in jobs.items()}
+
+    def status(self):
+        '''Returns the status of every source, with the lag worked out as of now: seconds since the last successful
+        refresh, and for sources with dated rows, whole days between the newest stored date and today.'''
+        now = time.time()
+        today = datetime.date.today()
+        sources = {}
+        for name, entry in self.sources.items():
+            entry = dict(entry)
+            entry['lag_seconds'] = round(now - entry['last_success'], 3) if entry['last_success'] else None
+            entry['data_lag_days'] = None
+            if entry['newest_date']:
+                newest = datetime.datetime.strptime(str(entry['newest_date']), '%Y%m%d').date()
+                entry['data_lag_days'] = (today - newest).days
+            entry['rows_per_second'] = round(entry['rows_total'] / entry['busy_seconds'], 1) if entry['busy_seconds'] else None
+            sources[name] = entry
+        return {'pid': os.getpid(), 'started': self.started, 'now': now, 'sources': sources}
+
+    def write_status(self):
+        '''Writes the status to status_path through a temporary file, so a reader never sees half of it.'''
+        temp = self.status_path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(self.status(), f, indent=2)
+        os.replace(temp, self.status_path)
+
+    async def run_job(self, name, refresh, interval, once=False):
+        entry = self.sources[name]
+        while True:
+            entry['last_started'] = time.time()
+            start = time.perf_counter()
+            error = None
+            try:
+                result = await asyncio.to_thread(refresh)
+            except Exception as e:
+                error = repr(e)
+            else:
+                seconds = time.perf_counter() - start
+                entry['failed_units'] += result['failed']
+                if result['failed'] and result['failed'] >= result['units']:
+                    error = f"all {result['units']} units failed"
+                else:
+                    entry['runs'] += 1
+                    entry['consecutive_errors'] = 0
+                    entry['rows_total'] += result['rows']
+                    entry['busy_seconds'] += seconds
+                    entry['last_rows'] = result['rows']
+                    entry['last_seconds'] = round(seconds, 3)
+                    entry['last_rows_per_second'] = round(result['rows'] / seconds, 1) if seconds else None
+                    if result['newest_date'] is not None:
+                        entry['newest_date'] = result['newest_date']
+                    #with units missing the source is still behind, so the lag keeps counting from the last full refresh
+                    if result['failed']:
+                        entry['last_error'] = f"{result['failed']} of {result['units']} units failed"
+                    else:
+                        entry['last_success'] = time.time()
+                    print(f"{name}: {result['rows']} rows in {result['commits']} commits, {seconds:.1f} s, {result['failed']} failed")
+            if error is not None:
+                #a failed refresh is counted and retried on the next tick, the daemon keeps going
+                entry['errors'] += 1
+                entry['consecutive_errors'] += 1
+                entry['last_error'] = error
+                print(f"{name}: refresh failed: {error}")
+
+            entry['next_run'] = None if once else time.time() + interval
+            self.write_status()
+            if once:
+                return
+            await asyncio.sleep(interval)
+
+    async def handle_status(self, reader, writer):
+        '''Answers GET /status (or /) with the status as JSON, and anything else with a 404.'''
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1] in ('/', '/status'):
+                status, body = '200 OK', json.dumps(self.status(), indent=2).encode()
+            else:
+                status, body = '404 Not Found', b'{"error": "not found"}'
+            writer.write(f'HTTP/1.0 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n'.encode() + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def run(self, once=False):
+        '''Runs the jobs until cancelled, or every job once with once=True, serving the status on status_port
+        meanwhile if one was given.'''
+        server = None
+        if self.status_port is not None:
+            server = await asyncio.start_server(self.handle_status, '127.0.0.1', self.status_port)
+            self.status_port = server.sockets[0].getsockname()[1]
+            print(f"status at http://127.0.0.1:{self.status_port}/status")
+        try:
+            await asyncio.gather(*(self.run_job(name, refresh, interval, once) for name, (refresh, interval) in self.jobs.items()))
+        finally:
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+
+
+def main(covid_every=COVID_EVERY, population_every=POPULATION_EVERY, batch_size=1000, sources=(pdm.POP_URL,),
+         status_file=STATUS_FILE, status_port=None, once=False, db_name=DB_NAME):
+    '''Sets up the jobs (an interval of 0 turns a source off) and runs the daemon until interrupted. The jobs share
+    one HttpCache, which revalidates every request since a 304 still costs less than the full history.'''
+    cache = HttpCache(ttl=0)
+    jobs = {}
+    if covid_every:
+        jobs['covid'] = (lambda: refresh_covid(db_name, batch_size, cache), covid_every)
+    if population_every:
+        jobs['population'] = (lambda: refresh_population(db_name, sources, cache=cache), population_every)
+    daemon = IngestDaemon(jobs, status_file, status_port)
+    try:
+        asyncio.run(daemon.run(once))
+    except KeyboardInterrupt:
+        print("stopped")
+    finally:
+        cache.report()
+        cache.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Keep finalProject.db up to date on a schedule')
+    parser.add_argument('--covid-every', type=float, default=COVID_EVERY, help='seconds between COVID refreshes, 0 to skip')
+    parser.add_argument('--population-every', type=float, default=POPULATION_EVERY, help='seconds between population refreshes, 0 to skip')
+    parser.add_argument('--batch-size', type=int, default=1000, help='CovidData rows per commit')
+    parser.add_argument('--source', nargs='+', default=[pdm.POP_URL], help='population pages, urls or saved html files')
+    parser.add_argument('--status-file', default=STATUS_FILE, help='where to write the status JSON after every refresh')
+    parser.add_argument('--status-port', type=int, help='also serve the status at http://127.0.0.1:PORT/status')
+    parser.add_argument('--once', action='store_true', help='refresh every source once and exit')
+    args = parser.parse_args()
+    main(args.covid_every, args.population_every, args.batch_size, args.source, args.status_file, args.status_port, args.once)
@@ -0,0 +1,66 @@
+import instrument
+
+#
+# Resumable ingest. Every unit of work, a (state, date) for the COVID data or a
+# (state, year) for the population data, is recorded in IngestCheckpoint in the
+# same transaction as its rows, so an interrupted run can simply be started
+# again: finished units are skipped and nothing is inserted twice.
+#
+
+
+def create_checkpoint_table(cur, conn):
+    '''Takes in the cur and conn variables. Creates the IngestCheckpoint table if it doesn't exist. Returns nothing.'''
+    cur.execute('CREATE TABLE IF NOT EXISTS IngestCheckpoint ("source" TEXT, "state" TEXT, "period" TEXT, PRIMARY KEY ("source", "state", "period"))')
+    conn.commit()
+
+
+def seed_checkpoints(cur, conn, source, select_sql):
+    '''This function takes in the cur and conn variables, the source name and a SELECT returning (state, period)
+    for every unit already in the database. It marks those units done so databases filled in by the old
+    25-rows-per-run code aren't fetched again. Returns nothing.'''
+    cur.execute(f'INSERT OR IGNORE INTO IngestCheckpoint (source, state, period) SELECT ?, * FROM ({select_sql})', (source,))
+    conn.commit()
+
+
+def completed_units(cur, source):
+    '''Returns a set of the (state, period) units of the given source that are already loaded.'''
+    cur.execute('SELECT state, period FROM IngestCheckpoint WHERE source = ?', (source,))
+    return set(cur.fetchall())
+
+
+def pending_units(cur, source, units):
+    '''This function takes in the cursor, the source name and a list of (state, period) units. Returns the units
+    that haven't been loaded yet, in their original order.'''
+    done = completed_units(cur, source)
+    return [unit for unit in units if (unit[0], str(unit[1])) not in done]
+
+
+def run_ingest(cur, conn, source, units, fetch_batch, insert_sql, batch_size=25, many=False):
+    '''This function takes in the cur and conn variables, the source name, the list of (state, period) units
+    that should end up loaded, a fetch_batch function and the INSERT statement for the rows, and the batch size.
+    fetch_batch takes a list of units and returns a list of (unit, row) pairs for the units it managed to fetch.
+    With many=True fetch_batch returns (unit, list of rows) pairs instead, for units that load many rows at once.
+    Only the missing units are fetched, batch_size at a time, and each batch's rows and checkpoints are
+    committed together. Units that fail to fetch are left pending for the next run. Returns the number of
+    units that are still pending.'''
+    pending = pending_units(cur, source, units)
+    print(f"{source}: {len(units) - len(pending)} of {len(units)} units already loaded")
+
+    for i in range(0, len(pending), batch_size):
+        batch = pending[i:i + batch_size]
+        with instrument.stage(f'{source}.fetch'):
+            fetched = fetch_batch(batch)
+
+        if many:
+            rows = [row for unit, unit_rows in fetched for row in unit_rows]
+        else:
+            rows = [row for unit, row in fetched]
+        with instrument.stage(f'{source}.commit'), conn:
+            conn.executemany(insert_sql, rows)
+            conn.executemany('INSERT INTO IngestCheckpoint (source, state, period) VALUES (?, ?, ?)',
+                             [(source, unit[0], str(unit[1])) for unit, row in fetched])
+        instrument.count('rows_written', len(rows))
+        instrument.count('commits')
+        print(f"{source}: loaded {len(fetched)} of {len(batch)} units in batch {i // batch_size + 1}")
+
+    return len(pending_units(cur, source, units))
@@ -0,0 +1,188 @@
+import cProfile
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+
+#
+# Opt-in run instrumentation. Code marks its stages with stage() or the
+# timed() decorator and bumps counters with count(); nothing is recorded
+# until enable() is called, so the hooks cost one attribute check per call
+# in a normal run. report() writes everything as one JSON document.
+#
+# Stage times from worker threads are added together, so a stage that ran
+# on ten threads at once can report more seconds than the wall clock.
+#
+
+
+class Recorder:
+    '''Holds the stage timings and counters of one run. profile is a set of stage names to run under
+    cProfile, with the stats dumped to profile_dir/<stage>.prof.'''
+
+    def __init__(self, profile=(), profile_dir='.'):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.profile = set(profile)
+        self.profile_dir = profile_dir
+        self.profilers = {}
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            entry = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def profiler(self, name):
+        '''Returns the cProfile.Profile collecting the given stage, or None if the stage isn't profiled.
+        cProfile only sees the thread it was enabled on, so a profiled stage should run on the main thread.'''
+        if name not in self.profile:
+            return None
+        with self.lock:
+            return self.profilers.setdefault(name, cProfile.Profile())
+
+    def dump_profiles(self):
+        '''Writes each profiled stage's stats to profile_dir and returns the list of paths.'''
+        paths = []
+        for name, profiler in self.profilers.items():
+            path = os.path.join(self.profile_dir, f'{name}.prof')
+            profiler.dump_stats(path)
+            paths.append(path)
+        return paths
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                'started': datetime.datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+                'wall_seconds': round(time.perf_counter() - self.start, 6),
+                'stages': {name: dict(entry) for name, entry in self.stages.items()},
+                'counters': dict(self.counters),
+            }
+
+
+recorder = None
+
+
+def enable(profile=(), profile_dir='.'):
+    '''Starts recording for this process and returns the Recorder. profile lists the stages to run under cProfile.'''
+    global recorder
+    recorder = Recorder(profile, profile_dir)
+    return recorder
+
+
+def disable():
+    global recorder
+    recorder = None
+
+
+def count(name, amount=1):
+    '''Adds amount to the named counter if recording is on.'''
+    if recorder is not None:
+        recorder.count(name, amount)
+
+
+def add_time(name, seconds):
+    '''Records a stage timing measured somewhere else, e.g. in a worker process.'''
+    if recorder is not None:
+        recorder.add_time(name, seconds)
+
+
+class stage:
+    '''Context manager that times the block under the given stage name, and profiles it if asked to.'''
+
+    def __init__(self, name):
+        self.name = name
+        self.profiler = None
+
+    def __enter__(self):
+        if recorder is not None:
+            self.profiler = recorder.profiler(self.name)
+            if self.profiler is not None:
+                self.profiler.enable()
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if recorder is not None:
+            recorder.add_time(self.name, time.perf_counter() - self.start)
+            if self.profiler is not None:
+                self.profiler.disable()
+
+
+def timed(name):
+    '''Decorator that runs every call of the function as the given stage.'''
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if recorder is None:
+                return func(*args, **kwargs)
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def metered(chunks, name='network'):
+    '''Passes through an iterator of byte chunks, adding the bytes to the "bytes" counter and the time spent
+    waiting for each chunk to the named stage. Wrapping a streamed response body this way separates time
+    on the network from time spent parsing what arrived.'''
+    if recorder is None:
+        yield from chunks
+        return
+    chunks = iter(chunks)
+    while True:
+        start = time.perf_counter()
+        chunk = next(chunks, None)
+        recorder.add_time(name, time.perf_counter() - start)
+        if chunk is None:
+            return
+        recorder.count('bytes', len(chunk))
+        yield chunk
+
+
+def report(path=None):
+    '''Returns the run's report as a dictionary and, if path is given, writes it there as JSON along with any
+    cProfile dumps. Returns None when recording is off.'''
+    if recorder is None:
+        return None
+    data = recorder.as_dict()
+    data['profiles'] = recorder.dump_profiles()
+    if path is not None:
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+    return data
+
+
+def add_arguments(parser):
+    '''Adds the --report and --profile options shared by the scripts to an argparse parser.'''
+    parser.add_argument('--report', metavar='PATH', help='record stage timings and counters and write them to PATH as JSON')
+    parser.add_argument('--profile', metavar='STAGE', nargs='+', default=[],
+                        help='run these stages under cProfile and dump STAGE.prof next to the report (implies recording)')
+
+
+def start_from_args(args):
+    '''Turns recording on if --report or --profile was given. Returns the report path to pass to finish_from_args.'''
+    if args.report or args.profile:
+        profile_dir = os.path.dirname(os.path.abspath(args.report)) if args.report else '.'
+        enable(args.profile, profile_dir)
+    return args.report
+
+
+def finish_from_args(path):
+    '''Writes the report started by start_from_args and says where it went.'''
+    data = report(path)
+    if data is None:
+        return
+    if path:
+        print(f"wrote run report to {path}")
+    for profile in data['profiles']:
+        print(f"wrote cProfile stats to {profile}")
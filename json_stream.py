@@ -0,0 +1,95 @@
+import codecs
+import json
+
+#
+# Incremental parsing for the per-state daily.json history. Records are
+# yielded one at a time as the bytes arrive, so only the record being
+# decoded (plus one network/disk chunk) is held in memory.
+#
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\r\n'
+
+
+def iter_file_chunks(path, chunk_size=CHUNK_SIZE):
+    '''Yields the bytes of the file at path chunk_size bytes at a time.'''
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def iter_body_chunks(body, chunk_size=CHUNK_SIZE):
+    '''Yields an already downloaded body chunk_size bytes at a time, the same way a streamed response would.'''
+    for i in range(0, len(body), chunk_size):
+        yield body[i:i + chunk_size]
+
+
+def iter_json_array(chunks):
+    '''This function takes in an iterable of bytes or str chunks that together make up a json array.
+    It yields each element of the array as soon as it has been fully received, keeping only the
+    unparsed tail of the input in memory. Raises ValueError if the input is not an array or is cut off.'''
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    started = False
+
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = utf8.decode(chunk)
+        buf += chunk
+        pos = 0
+
+        while True:
+            while pos < len(buf) and (buf[pos] in WHITESPACE or (started and buf[pos] == ',')):
+                pos += 1
+            if pos == len(buf):
+                break
+            if not started:
+                if buf[pos] != '[':
+                    raise ValueError("expected a json array")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                #the element isn't complete yet, wait for the next chunk
+                break
+            if not isinstance(item, (dict, list)) and (end == len(buf) or buf[end] not in WHITESPACE + ',]'):
+                #a bare number split at a digit, "." or "e" parses as a shorter number, it's only done at a separator
+                break
+            yield item
+            pos = end
+
+        buf = buf[pos:]
+
+    raise ValueError("json array ended before its closing bracket")
+
+
+def find_dates(records, target_dates, newest_first=True):
+    '''This function takes in an iterable of daily records (dictionaries with a "date" key), a collection of
+    dates as YYYYMMDD ints and whether the records are sorted newest first, like daily.json is. It stops reading
+    records as soon as every target date has been found, or once it has gone past the oldest target date.
+    Returns a dictionary with date as key and the matching record as value.'''
+    remaining = set(int(d) for d in target_dates)
+    found = {}
+    if not remaining:
+        return found
+    oldest = min(remaining)
+
+    for record in records:
+        date = record.get("date")
+        if date in remaining:
+            found[date] = record
+            remaining.discard(date)
+            if not remaining:
+                break
+        elif newest_first and date is not None and date < oldest:
+            break
+
+    return found
@@ -0,0 +1,53 @@
+import heapq
+
+#
+# Population-adjusted metrics for every region in one statement: cases per
+# 100k on both dates, population growth between the two census years (the
+# same 2020/2010 ratio the population export writes) and case growth per
+# capita. Each table is joined on state_id through its index, with LEFT
+# JOINs from States so a region missing some of the data keeps its row
+# with NULLs instead of dropping out or shifting its neighbours.
+#
+
+START_DATE = '20201201'
+END_DATE = '20210307'
+
+METRIC_COLUMNS = ['state', 'name', 'start_cases', 'end_cases', 'base_population', 'population',
+                  'start_cases_per_100k', 'end_cases_per_100k', 'population_growth', 'case_growth_per_capita']
+
+METRICS_SQL = '''SELECT States.state AS state, States.name AS name,
+        start.number_of_cases AS start_cases, finish.number_of_cases AS end_cases,
+        base.population AS base_population, pop.population AS population,
+        start.number_of_cases * 100000.0 / NULLIF(pop.population, 0) AS start_cases_per_100k,
+        finish.number_of_cases * 100000.0 / NULLIF(pop.population, 0) AS end_cases_per_100k,
+        pop.population * 1.0 / NULLIF(base.population, 0) AS population_growth,
+        (finish.number_of_cases - start.number_of_cases) * 1.0 / NULLIF(pop.population, 0) AS case_growth_per_capita
+    FROM States
+    LEFT JOIN CovidData AS start ON start.state_id = States.state_id
+        AND start.date_id = (SELECT date_id FROM Dates WHERE date = :start_date)
+    LEFT JOIN CovidData AS finish ON finish.state_id = States.state_id
+        AND finish.date_id = (SELECT date_id FROM Dates WHERE date = :end_date)
+    LEFT JOIN Population AS base ON base.state_id = States.state_id AND base.year = :base_year
+    LEFT JOIN Population AS pop ON pop.state_id = States.state_id AND pop.year = :pop_year
+    ORDER BY States.state_id'''
+
+
+def metrics_params(start=START_DATE, end=END_DATE, pop_year=2020, base_year=2010):
+    '''Returns the named parameters METRICS_SQL takes for a window of two YYYYMMDD dates and two census years.'''
+    return {'start_date': str(start), 'end_date': str(end), 'pop_year': int(pop_year), 'base_year': int(base_year)}
+
+
+def compute_metrics(cur, start=START_DATE, end=END_DATE, pop_year=2020, base_year=2010):
+    '''This function takes in the cursor, the two YYYYMMDD dates cases are compared between, the population year
+    the per-capita numbers use and the earlier census year population growth is measured from. Returns one tuple
+    per registered region, in state_id order, with the values named in METRIC_COLUMNS. A value is None when the
+    data it needs is missing.'''
+    cur.execute(METRICS_SQL, metrics_params(start, end, pop_year, base_year))
+    return cur.fetchall()
+
+
+def top_regions(rows, column, n=10):
+    '''Takes in rows from compute_metrics, one of METRIC_COLUMNS and how many regions to keep. Returns the n rows
+    with the highest value in that column, biggest first, leaving out rows where it's None.'''
+    index = METRIC_COLUMNS.index(column)
+    return heapq.nlargest(n, (row for row in rows if row[index] is not None), key=lambda row: row[index])
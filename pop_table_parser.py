@@ -0,0 +1,218 @@
+import re
+from html.parser import HTMLParser
+
+from states import STATE_NAMES
+
+#
+# Single-pass extraction of the population table on the Wikipedia page.
+# The page is fed to a streaming tokenizer that ignores everything outside
+# the first "wikitable sortable" table and stops as soon as that table
+# closes, so no tree is built for the rest of the page. Columns are found
+# by their header text rather than by position.
+#
+
+FOOTNOTE = re.compile(r'\[[^\]]*\]')
+YEAR = re.compile(r'\b(1[789]\d\d|20\d\d)\b')
+FEED_SIZE = 8 * 1024
+TABLE_TAG = re.compile(r'<table[^>]*\bclass\s*=\s*["\']([^"\']*)["\']', re.IGNORECASE)
+
+
+class TableExtractor(HTMLParser):
+    '''Collects the rows of the first table whose class list contains every class in table_class. Each row
+    is a list of (text, rowspan, colspan, is_header) cells. done is set once the table has been closed.'''
+
+    def __init__(self, table_class='wikitable sortable'):
+        super().__init__()
+        self.wanted = set(table_class.split())
+        self.depth = 0
+        self.done = False
+        self.rows = []
+        self.row = None
+        self.cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == 'table':
+            if self.depth:
+                self.depth += 1
+            elif self.wanted <= set((dict(attrs).get('class') or '').split()):
+                self.depth = 1
+            return
+        #only look at rows of the target table itself, not of tables nested inside it
+        if self.depth != 1:
+            return
+        if tag == 'tr':
+            self.row = []
+        elif tag in ('td', 'th') and self.row is not None:
+            attrs = dict(attrs)
+            self.cell = [[], span(attrs.get('rowspan')), span(attrs.get('colspan')), tag == 'th']
+        elif tag == 'br' and self.cell is not None:
+            self.cell[0].append(' ')
+
+    def handle_endtag(self, tag):
+        if self.done or not self.depth:
+            return
+        if tag == 'table':
+            self.depth -= 1
+            if not self.depth:
+                self.end_row()
+                self.done = True
+            return
+        if self.depth != 1:
+            return
+        if tag in ('td', 'th'):
+            self.end_cell()
+        elif tag == 'tr':
+            self.end_row()
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell[0].append(data)
+
+    def end_cell(self):
+        if self.cell is not None:
+            text = ' '.join(FOOTNOTE.sub('', ''.join(self.cell[0])).split())
+            self.row.append((text, self.cell[1], self.cell[2], self.cell[3]))
+            self.cell = None
+
+    def end_row(self):
+        self.end_cell()
+        if self.row:
+            self.rows.append(self.row)
+        self.row = None
+
+
+def span(value):
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return 1
+
+
+def expand_rows(rows):
+    '''Lays the rows out on a grid, copying cells with a rowspan or colspan into every slot they cover.
+    Returns a list of (texts, is_header_row) tuples.'''
+    grid = []
+    carried = {}
+    for row in rows:
+        texts = []
+        col = 0
+        cells = iter(row)
+        is_header = all(cell[3] for cell in row)
+        while True:
+            if col in carried:
+                text, left = carried[col]
+                texts.append(text)
+                if left == 1:
+                    del carried[col]
+                else:
+                    carried[col] = (text, left - 1)
+                col += 1
+                continue
+            cell = next(cells, None)
+            if cell is None:
+                break
+            text, rowspan, colspan = cell[0], cell[1], cell[2]
+            for _ in range(colspan):
+                texts.append(text)
+                if rowspan > 1:
+                    carried[col] = (text, rowspan - 1)
+                col += 1
+        grid.append((texts, is_header))
+    return grid
+
+
+def population_columns(headers):
+    '''Returns a dictionary with year as key and the index of its population column (census or estimate) as value,
+    in the order the columns appear. The first column for a year wins.'''
+    columns = {}
+    for i, header in enumerate(headers):
+        lowered = header.lower()
+        if 'population' not in lowered and 'estimate' not in lowered:
+            continue
+        for year in YEAR.findall(header):
+            columns.setdefault(int(year), i)
+    return columns
+
+
+def find_state_column(rows, states):
+    '''Returns the index of the column holding the most of the given state names. Headers like "Rank in states
+    & territories" make the state column hard to pick out by name, but its values are unmistakable.'''
+    counts = {}
+    for row in rows:
+        for i, text in enumerate(row):
+            if text in states:
+                counts[i] = counts.get(i, 0) + 1
+    if not counts:
+        raise ValueError("no column of state names found")
+    return max(counts, key=counts.get)
+
+
+def extract_table(page, table_class='wikitable sortable'):
+    '''This function takes in the page html as text, or an iterable of text chunks, and the class of the wanted
+    table. It feeds the page to a TableExtractor chunk by chunk and stops as soon as the table has closed.
+    Returns a tuple of the column headers (header rows joined top to bottom) and the list of data rows.'''
+    if isinstance(page, str):
+        #jump straight to the first <table> that could be the one we want instead of tokenizing the page before it
+        start = page.find('<table')
+        for match in TABLE_TAG.finditer(page):
+            if set(table_class.split()) <= set(match.group(1).split()):
+                start = match.start()
+                break
+        text = page[max(start, 0):]
+        page = (text[i:i + FEED_SIZE] for i in range(0, len(text), FEED_SIZE))
+
+    parser = TableExtractor(table_class)
+    for chunk in page:
+        parser.feed(chunk)
+        if parser.done:
+            break
+    parser.close()
+    if not parser.rows:
+        raise ValueError(f"no table with class '{table_class}' found")
+
+    headers = []
+    data = []
+    for texts, is_header in expand_rows(parser.rows):
+        if is_header and not data:
+            for i, text in enumerate(texts):
+                if i == len(headers):
+                    headers.append(text)
+                elif text and text not in headers[i]:
+                    headers[i] = headers[i] + ' ' + text
+        else:
+            data.append(texts)
+    return headers, data
+
+
+def extract_population(page, years=(2020, 2010), states=None):
+    '''This function takes in the Wikipedia page html (text or text chunks), the census years wanted and the full
+    state names to keep (the 50 states by default, which drops DC and the territories). It finds the state column
+    and one population column per year by header name (one mentioning the year and "population" or "estimate") in a
+    single pass over the table; years=None takes every year with a population column. Returns a dictionary with year as key and a dictionary of state name to population
+    text (e.g. "39,538,223") as value.'''
+    if states is None:
+        states = set(STATE_NAMES.values())
+    headers, rows = extract_table(page)
+    #years are matched to columns by one rule, so every year found with years=None can also be asked for
+    columns = population_columns(headers)
+    if years is None:
+        years = list(columns)
+    missing = [year for year in years if year not in columns]
+    if missing:
+        raise ValueError(f"no population column for {missing}")
+
+    state_col = find_state_column(rows, states)
+    year_cols = {year: columns[year] for year in years}
+
+    populations = {year: {} for year in years}
+    for row in rows:
+        if len(row) <= max([state_col] + list(year_cols.values())):
+            continue
+        state = row[state_col]
+        if state not in states:
+            continue
+        for year, col in year_cols.items():
+            populations[year][state] = row[col]
+    return populations
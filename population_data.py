@@ -1,155 +1,104 @@
-import requests
-import sqlite3
-import json
-import os 
-from bs4 import BeautifulSoup
-import matplotlib.pyplot as plt 
+import argparse
+import instrument
+import os
+from db import setUpDatabase
+from export import export
+from http_cache import HttpCache
+from covid_data import state_table
+from state_summary import create_summary_tables, refresh_summary
+from states import region_ids_by_name, regions_for
+from population_snapshots import create_snapshot_table, ingest_snapshots
 
 #
 # Name: Mingxuan Sun
 # Who did you work with: Tiara Amadia
 #
 
+POP_URL = 'https://en.wikipedia.org/wiki/List_of_states_and_territories_of_the_United_States_by_population'
 
-def setUpDatabase(db_name):
-    '''This function takes in the name of the database, makes a connection to server
-    using nane given, and returns cur and conn as the cursor and connection variable
-    to allow database access.'''
-    
-    path = os.path.dirname(os.path.abspath(__file__))
-    conn = sqlite3.connect(path+'/'+db_name)
-    cur = conn.cursor()
-    return cur, conn
-
-def pop_table(cur, conn, pop_dict, date, count): 
-    '''This function takes in the cursor and connection variables to database, state, year and number of US Population for that state. It creates a table in the database if it doesn’t exist and inserts the state, date and number of population. Returns nothing'''
-    
-    cur.execute('CREATE TABLE IF NOT EXISTS Population ("id" INTEGER PRIMARY KEY, "state" TEXT, "population" INTEGER)')
 
-    # Inserting 50 states at a time into Population Database
-    for x in pop_dict:
-       
-        cur.execute('INSERT INTO Population (id, state, population) VALUES (?, ?, ?)', (count, x + ":" + str(date), pop_dict[x]))
-        count += 1
-       
+def create_population_table(cur, conn):
+    '''This function takes in the cursor and connection variables and creates the Population table if it doesn’t exist, with one integer population per (state_id, year) and a composite index on the pair. Called once per connection instead of once per insert. Returns nothing'''
+    cur.execute('CREATE TABLE IF NOT EXISTS Population ("id" INTEGER PRIMARY KEY, "state_id" INTEGER REFERENCES States (state_id), "year" INTEGER, "population" INTEGER)')
+    cur.execute('CREATE UNIQUE INDEX IF NOT EXISTS Population_state_year ON Population (state_id, year)')
     conn.commit()
 
-def percent_changes(cur, conn):
-    '''This function takes in cursor and connection variables. It grabs the population and states from the database, seeds out the 2020 and 2010 population, append the state name into a labels list and its population numbers to the population list. Calculate percentage changes and write the calculations onto a txt file. Returns nothing.'''
-
-    labels2020 = []
-    pop2020 = []
-
-    # Grabbing Populations and States from the Database
-    cursor = cur.execute("SELECT state, population FROM Population")
-    for row in cursor:
-        if row[0].split(":")[1] == "2020":
-            labels2020.append(row[0].split(":")[0])
-            num = row[1]
-            num = int(num.replace(',', ''))
-            pop2020.append(num)
-
-    labels2010 = []
-    pop2010 = []
-
-    cursor = cur.execute("SELECT state, population FROM Population")
-    for row in cursor:
-        if row[0].split(":")[1] == "2010":
-            labels2010.append(row[0].split(":")[0])
-            num = row[1]
-            num = int(num.replace(',', ''))
-            pop2010.append(num)
-
-    f = open("pop_calculations.txt", "w+")
-    for x in range(len(labels2010)):
-
-        f.write(labels2010[x] + " has had a " + str(pop2020[x]/pop2010[x]) + " change in population\n")
-
-    f.close()
-
-def pop_table_length(cur, conn):
-    '''This function calculates the number of rows in the CovidData table to help with extracting
-    25 lines at a time. Returns the number of rows in the table as an int.'''
-    cur.execute('CREATE TABLE IF NOT EXISTS Population ("id" INTEGER PRIMARY KEY, "state" TEXT, "population" INTEGER)')
-    cur.execute('SELECT MAX(id) FROM Population')
-    data = cur.fetchone()
-    num = data[0]
-    return num
+def migrate_population(cur, conn):
+    '''This function takes in the cursor and connection variables and converts a Population table in the old format ("State:YYYY" text keys and comma formatted population text) to the normalized one in place, in a single transaction. States needs to be filled in first. Does nothing if the table is missing or already converted. Returns the number of old rows that couldn't be matched to a state and were dropped.'''
+    cur.execute('PRAGMA table_info(Population)')
+    columns = [row[1] for row in cur.fetchall()]
+    if 'state' not in columns:
+        return 0
+
+    try:
+        cur.execute('BEGIN')
+        cur.execute('CREATE TABLE Population_new ("id" INTEGER PRIMARY KEY, "state_id" INTEGER REFERENCES States (state_id), "year" INTEGER, "population" INTEGER)')
+        cur.execute('''INSERT OR IGNORE INTO Population_new (state_id, year, population)
+            SELECT States.state_id,
+                CAST(substr(Population.state, instr(Population.state, ':') + 1) AS INTEGER),
+                CAST(REPLACE(Population.population, ',', '') AS INTEGER)
+            FROM Population
+            JOIN States ON States.name = substr(Population.state, 1, instr(Population.state, ':') - 1)
+            ORDER BY Population.id''')
+        cur.execute('SELECT (SELECT COUNT(*) FROM Population) - (SELECT COUNT(*) FROM Population_new)')
+        dropped = cur.fetchone()[0]
+        cur.execute('DROP TABLE Population')
+        cur.execute('ALTER TABLE Population_new RENAME TO Population')
+        cur.execute('CREATE UNIQUE INDEX Population_state_year ON Population (state_id, year)')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return dropped
+
+def state_ids_by_name(cur):
+    '''Returns a dictionary with full region name as key and state_id as value, from the States registry.'''
+    return region_ids_by_name(cur)
+
+@instrument.timed('percent_changes')
+def percent_changes(cur, conn, filename='pop_calculations.csv'):
+    '''This function takes in cursor and connection variables and the output file name. It streams the 2010 and 2020 population of every state, joined with one indexed self-join on (state_id, year), and the percentage change between them to the file next to the scripts. The extension of filename picks the format (.csv, .npy, or .arrow/.parquet with pyarrow). Returns the number of rows written.'''
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    return export(cur, 'population', path)
 
 ############################################################
 
- 
-def get_pop_2020(soup): 
-    '''This function takes in a soup request called in the main() and finds the table retaining population numbers through class tag. Then it finds the rows of the table and iterates through the rows to scrape state names and population numbers. It appends the state and population number into a dictionary where state is key and population number is value. It removes District of Columbia to get 50 states. Returns dictionary containing state name and 2020 population numbers.'''
-
-    table = soup.find('table',{'class':'wikitable sortable'})
-    body = table.find('tbody')
-    all_rows = body.find_all('tr')
-
-    key_pop_2020_dict = {}
-
-    for row in all_rows[2:53]: 
-        row_cells = row.find_all('td')
-        key = row_cells[2].text.strip()
-        value = row_cells[3].text.strip()
-        key_pop_2020_dict[key] = value
-
-    key_pop_2020_dict.pop('District of Columbia')
-
-    return key_pop_2020_dict
-
-def get_pop_2010(soup): 
-    '''This function takes in a soup request called in the main() and finds the table retaining population numbers through class tag. Then it finds the rows of the table and iterates through the rows to scrape state names and population numbers. It appends the state and population number into a dictionary where state is key and population number is value. It removes District of Columbia to get 50 states. Returns dictionary containing state name and 2010 population numbers.'''
-
-
-    table = soup.find('table',{'class':'wikitable sortable'})
-    body = table.find('tbody')
-    all_rows = body.find_all('tr')
-
-    key_pop_2010_dict = {}
-
-    for row in all_rows[2:53]: 
-        row_cells = row.find_all('td')
-        key = row_cells[2].text.strip()
-        value = row_cells[4].text.strip()
-        key_pop_2010_dict[key] = value
-    
-    key_pop_2010_dict.pop('District of Columbia')
-
-    return key_pop_2010_dict
-
-
-def main(): 
-    soup = BeautifulSoup(requests.get('https://en.wikipedia.org/wiki/List_of_states_and_territories_of_the_United_States_by_population').text, 'html.parser')
-    
-    pop_2020 = get_pop_2020(soup)
-    pop_2020_firsthalf = dict(list(pop_2020.items())[:25])
-    pop_2020_secondhalf = dict(list(pop_2020.items())[25:])
-
-    pop_2010 = get_pop_2010(soup)
-    pop_2010_firsthalf = dict(list(pop_2010.items())[:25])
-    pop_2010_secondhalf = dict(list(pop_2010.items())[25:])
 
+def main(offline=False, regions='states', sources=(POP_URL,), workers=4, years=None): 
+    '''Loads the population of every registered region from each source, a url (fetched through the on-disk HttpCache, or only from it with offline=True) or a saved html file, for every year the page has a population column (or just years). Sources are fetched and parsed in parallel, and one whose page hasn't changed since it was last loaded is skipped, so a re-run only costs a hash per source. regions picks what is registered: 'states', 'all' (adds DC and the territories) or a csv file of regions. Once every source is loaded it writes the population percent changes. Returns nothing.'''
     cur, conn = setUpDatabase("finalProject.db")
-
-    num = pop_table_length(cur, conn)
-
-    if num == None:
-        pop_table(cur, conn, pop_2010_firsthalf, "2010", 1)
+    state_table(cur, conn, regions_for(regions))
+    dropped = migrate_population(cur, conn)
+    if dropped:
+        print(f"{dropped} old Population rows didn't match a state and were dropped")
+    create_population_table(cur, conn)
+    create_summary_tables(cur, conn)
+    create_snapshot_table(cur, conn)
+
+    cache = HttpCache(offline=offline)
+    result = ingest_snapshots(cur, conn, list(sources), state_ids_by_name(cur), cache, years, workers)
+    cache.report()
+    cache.close()
+    print(f"{result['loaded']} sources loaded, {result['skipped']} unchanged, {result['failed']} failed, {result['rows']} population rows written")
+
+    with instrument.stage('refresh_summary'):
+        print(f"refreshed the summary for {refresh_summary(cur, conn)} states")
+    if result['failed']:
+        print(f"{result['failed']} sources failed, run again to retry them")
         return
-    elif type(num) == int:
-        if num <= 25:
-            pop_table(cur, conn, pop_2010_secondhalf, "2010", 26)
-            return
-        if num <= 50:
-            pop_table(cur, conn, pop_2020_firsthalf, "2020", 51)
-            return
-        if num <= 75:
-            pop_table(cur, conn, pop_2020_secondhalf, "2020", 76)
 
     percent_changes(cur, conn)
     
 
 if __name__ == "__main__":
-    main()
-      
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Load state populations into finalProject.db')
+    parser.add_argument('--offline', action='store_true', help='only use the cached copy of the page')
+    parser.add_argument('--source', nargs='+', default=[POP_URL], help='urls or saved html files of population pages, later ones win for the same year')
+    parser.add_argument('--workers', type=int, default=4, help='fetch threads and parse processes')
+    parser.add_argument('--years', type=int, nargs='+', help='only load these years (default: every year with a population column)')
+    parser.add_argument('--regions', default='states', help="'states', 'all' (adds DC and the territories) or a csv file of abbreviation,name,fips")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    report_path = instrument.start_from_args(args)
+    main(args.offline, args.regions, args.source, args.workers, args.years)
+    instrument.finish_from_args(report_path)
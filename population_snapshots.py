@@ -0,0 +1,178 @@
+import hashlib
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import requests
+
+import instrument
+from fetcher import make_session
+from http_cache import CacheMiss
+from pop_table_parser import extract_population
+
+#
+# Population ingest from any number of sources at once. A source is the url
+# of a page shaped like the Wikipedia population list (the live page or an
+# archived copy) or the path of a saved html file, so the whole pipeline can
+# run against fixtures. Sources are fetched concurrently, parsed in a process
+# pool into typed (state, year, population) rows for every year that has a
+# population column, and saved one source per transaction.
+#
+# PopulationSnapshot keeps the sha256 of each source's page as last loaded.
+# A page whose hash hasn't changed is skipped before parsing, so a re-run
+# over unchanged sources costs a fetch (usually an HttpCache hit) and a hash.
+# When several sources have the same year, the later one in the list wins:
+# once one source has changed, every source after it is saved again on top.
+#
+
+POP_UPSERT = ('INSERT INTO Population (state_id, year, population) VALUES (?, ?, ?) '
+              'ON CONFLICT (state_id, year) DO UPDATE SET population = excluded.population '
+              'WHERE population != excluded.population')
+
+
+def create_snapshot_table(cur, conn):
+    '''Takes in the cur and conn variables. Creates the PopulationSnapshot table if it doesn't exist, with one row
+    per source holding the hash of its page, a hash of what was asked of it (regions and years) and when it was
+    loaded. Returns nothing.'''
+    cur.execute('CREATE TABLE IF NOT EXISTS PopulationSnapshot ("source" TEXT PRIMARY KEY, "sha256" TEXT, "wanted" TEXT, '
+                '"years" TEXT, "rows" INTEGER, "loaded_at" REAL)')
+    conn.commit()
+
+
+def is_url(source):
+    return source.startswith('http://') or source.startswith('https://')
+
+
+def read_source(source, session, cache=None):
+    '''Returns the page of one source as bytes: a url goes through the HttpCache when one is given, anything else
+    is read as a file.'''
+    if not is_url(source):
+        with open(source, 'rb') as f:
+            return f.read()
+    if cache is not None:
+        return cache.get(session, source)
+    resp = session.get(source, timeout=30)
+    resp.raise_for_status()
+    return resp.content
+
+
+def fetch_sources(sources, cache=None, max_workers=4):
+    '''This function takes in a list of sources, an optional HttpCache and the number of fetch threads. It reads
+    every source at once on a thread pool sharing one session. Returns a dictionary with source as key and the
+    page bytes as value, or None for a source that couldn't be read, so one bad source doesn't stop the rest.'''
+    session = make_session(max_workers)
+
+    def fetch_one(source):
+        try:
+            return read_source(source, session, cache)
+        except (requests.RequestException, OSError, CacheMiss) as e:
+            print(f"failed to read {source}: {e!r}")
+            return None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return dict(zip(sources, pool.map(fetch_one, sources)))
+    finally:
+        session.close()
+
+
+def content_hash(body):
+    return hashlib.sha256(body).hexdigest()
+
+
+def wanted_hash(names, years):
+    '''Hashes the region names and years asked of a page, so registering new regions reloads unchanged pages.'''
+    return content_hash(repr((sorted(names), sorted(years) if years is not None else None)).encode())
+
+
+def parse_snapshot(body, names, years=None):
+    '''Worker for parse_snapshots. Takes in a page as bytes, the full region names to keep and the years wanted
+    (every year with a population column if None). Returns a dictionary with year as key and a dictionary of
+    region name to population as an int as value, leaving out cells that aren't a number.'''
+    pops = extract_population(body.decode('utf-8'), years=years, states=set(names))
+    typed = {}
+    for year, by_name in pops.items():
+        typed[year] = {name: int(text.replace(',', '')) for name, text in by_name.items() if text.replace(',', '').isdigit()}
+    return typed
+
+
+def parse_snapshots(pages, names, years=None, workers=4):
+    '''This function takes in a dictionary of source to page bytes, the region names and years to keep and the
+    number of worker processes. Parses every page with parse_snapshot, in a process pool when there is more than
+    one page. Returns a dictionary with source as key and the parsed populations, or the exception raised while
+    parsing that page, as value.'''
+    names = sorted(names)
+    parsed = {}
+    if workers <= 1 or len(pages) <= 1:
+        for source, body in pages.items():
+            try:
+                parsed[source] = parse_snapshot(body, names, years)
+            except ValueError as e:
+                parsed[source] = e
+        return parsed
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(pages))) as pool:
+        jobs = {source: pool.submit(parse_snapshot, body, names, years) for source, body in pages.items()}
+        for source, job in jobs.items():
+            try:
+                parsed[source] = job.result()
+            except ValueError as e:
+                parsed[source] = e
+    return parsed
+
+
+def save_snapshot(cur, conn, source, digest, wanted, pops, ids):
+    '''This function takes in the cur and conn variables, a source, its page hash and wanted hash, its parsed
+    populations and a dictionary of full region name to state_id. Writes the populations, updating rows whose
+    value changed, and records the snapshot, in one transaction. Returns the number of rows inserted or changed.'''
+    rows = [(ids[name], year, population) for year, by_name in pops.items() for name, population in by_name.items() if name in ids]
+    with conn:
+        #rowcount leaves out the SummaryChangeLog rows the Population triggers write, total_changes wouldn't
+        written = conn.executemany(POP_UPSERT, rows).rowcount
+        conn.execute('INSERT OR REPLACE INTO PopulationSnapshot (source, sha256, wanted, years, rows, loaded_at) VALUES (?, ?, ?, ?, ?, ?)',
+                     (source, digest, wanted, ','.join(str(year) for year in sorted(pops)), len(rows), time.time()))
+    return written
+
+
+def ingest_snapshots(cur, conn, sources, ids, cache=None, years=None, workers=4):
+    '''This function takes in the cur and conn variables, the list of sources, a dictionary of full region name to
+    state_id for the regions to load, an optional HttpCache, the years wanted (every year on the page if None)
+    and the number of fetch threads and parse processes. Fetches every source, skips the ones before the first
+    changed source whose page and request match the stored snapshot, parses the rest in parallel and saves each one.
+    Returns a dictionary counting the sources 'loaded', 'skipped' and 'failed' and the population 'rows' inserted or
+    changed.'''
+    result = {'loaded': 0, 'skipped': 0, 'failed': 0, 'rows': 0}
+    wanted = wanted_hash(ids, years)
+
+    with instrument.stage('snapshot.fetch'):
+        pages = fetch_sources(sources, cache, workers)
+
+    changed = {}
+    digests = {}
+    for source in sources:
+        body = pages[source]
+        if body is None:
+            result['failed'] += 1
+            continue
+        digests[source] = content_hash(body)
+        cur.execute('SELECT sha256, wanted FROM PopulationSnapshot WHERE source = ?', (source,))
+        #after a changed source the unchanged ones still have to be saved again, or it would win over them
+        if not changed and cur.fetchone() == (digests[source], wanted):
+            result['skipped'] += 1
+            instrument.count('snapshots_skipped')
+            continue
+        changed[source] = body
+
+    with instrument.stage('snapshot.parse'):
+        parsed = parse_snapshots(changed, ids, years, workers)
+
+    with instrument.stage('snapshot.save'):
+        #saved in the order given, so a later source overrides an earlier one for the same year
+        for source in changed:
+            if isinstance(parsed[source], Exception):
+                print(f"couldn't parse {source}: {parsed[source]}")
+                result['failed'] += 1
+                continue
+            result['rows'] += save_snapshot(cur, conn, source, digests[source], wanted, parsed[source], ids)
+            result['loaded'] += 1
+    instrument.count('rows_written', result['rows'])
+    return result
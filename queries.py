@@ -0,0 +1,111 @@
+#
+# Query layer for the CovidData/States/Dates join. Date and state filters
+# go in the WHERE clause so SQLite can answer them from the indexes below
+# instead of the callers fetching the whole join and filtering in Python.
+# The SQL strings are constants, so sqlite3's per-connection statement
+# cache prepares each one once and reuses it on every call.
+#
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS CovidData_state_date ON CovidData (state_id, date_id)',
+    'CREATE INDEX IF NOT EXISTS CovidData_date ON CovidData (date_id)',
+    'CREATE UNIQUE INDEX IF NOT EXISTS Dates_date_unique ON Dates (date)',
+    'CREATE UNIQUE INDEX IF NOT EXISTS States_state_unique ON States (state)',
+]
+
+CASES_ON_DATE = '''SELECT States.state, Dates.date, CovidData.number_of_cases
+    FROM Dates
+    JOIN CovidData ON CovidData.date_id = Dates.date_id
+    JOIN States ON States.state_id = CovidData.state_id
+    WHERE Dates.date = ?'''
+
+CASES_FOR_STATE = '''SELECT States.state, Dates.date, CovidData.number_of_cases
+    FROM States
+    JOIN CovidData ON CovidData.state_id = States.state_id
+    JOIN Dates ON Dates.date_id = CovidData.date_id
+    WHERE States.state = ? AND Dates.date BETWEEN ? AND ?
+    ORDER BY Dates.date'''
+
+CASES_BETWEEN = '''SELECT States.state, Dates.date, CovidData.number_of_cases
+    FROM Dates
+    JOIN CovidData ON CovidData.date_id = Dates.date_id
+    JOIN States ON States.state_id = CovidData.state_id
+    WHERE Dates.date BETWEEN ? AND ?'''
+
+FIRST_DATE = '00000000'
+LAST_DATE = '99999999'
+
+
+def ensure_indexes(cur, conn):
+    '''Takes in the cur and conn variables. Creates the indexes the queries below rely on if they don't exist
+    and refreshes the planner statistics. Returns nothing.'''
+    for sql in INDEXES:
+        cur.execute(sql)
+    cur.execute('ANALYZE')
+    conn.commit()
+
+
+def has_table(cur, name):
+    '''Returns whether the database has a table with the given name.'''
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cur.fetchone() is not None
+
+
+def has_typed_population(cur):
+    '''Returns whether Population is there in the (state_id, year) form. A table still in the old "State:YYYY" form
+    is left alone until population_data.py migrates it.'''
+    cur.execute('PRAGMA table_info(Population)')
+    columns = [row[1] for row in cur.fetchall()]
+    return 'state_id' in columns and 'year' in columns
+
+
+def cases_on_date(cur, date):
+    '''Returns a list of (state, date, number_of_cases) rows for every state on the given YYYYMMDD date.'''
+    cur.execute(CASES_ON_DATE, (str(date),))
+    return cur.fetchall()
+
+
+def cases_for_state(cur, state, start=None, end=None):
+    '''Returns a list of (state, date, number_of_cases) rows for one lowercase state abbreviation, oldest first,
+    optionally limited to the dates between start and end (inclusive).'''
+    cur.execute(CASES_FOR_STATE, (state, str(start or FIRST_DATE), str(end or LAST_DATE)))
+    return cur.fetchall()
+
+
+def iter_cases_for_state(cur, state, start=None, end=None):
+    '''Same as cases_for_state, but returns the executed cursor so the rows can be streamed instead of fetched all at once.'''
+    return cur.execute(CASES_FOR_STATE, (state, str(start or FIRST_DATE), str(end or LAST_DATE)))
+
+
+def count_cases_for_state(cur, state, start=None, end=None):
+    '''Returns how many of the rows cases_for_state would return have a number of cases, counted on the index.'''
+    cur.execute(f'SELECT COUNT(number_of_cases) FROM ({CASES_FOR_STATE})', (state, str(start or FIRST_DATE), str(end or LAST_DATE)))
+    return cur.fetchone()[0]
+
+
+def cases_between(cur, start, end):
+    '''Returns a list of (state, date, number_of_cases) rows for every state on the dates between start and end (inclusive).'''
+    cur.execute(CASES_BETWEEN, (str(start), str(end)))
+    return cur.fetchall()
+
+
+def explain(cur, sql, params=()):
+    '''Returns the EXPLAIN QUERY PLAN detail lines for a statement.'''
+    cur.execute('EXPLAIN QUERY PLAN ' + sql, params)
+    return [row[3] for row in cur.fetchall()]
+
+
+def check_query_plans(cur):
+    '''This function takes in the cursor and runs EXPLAIN QUERY PLAN on every query in this module. Returns a
+    dictionary with query name as key and its plan as value, and raises AssertionError if any of them would
+    scan the whole CovidData table, which means an index is missing.'''
+    plans = {
+        'cases_on_date': explain(cur, CASES_ON_DATE, ('20201201',)),
+        'cases_for_state': explain(cur, CASES_FOR_STATE, ('ca', FIRST_DATE, LAST_DATE)),
+        'cases_between': explain(cur, CASES_BETWEEN, ('20201201', '20201231')),
+    }
+    for name, plan in plans.items():
+        for line in plan:
+            if line.startswith('SCAN CovidData'):
+                raise AssertionError(f"{name} does a full scan of CovidData: {plan}")
+    return plans
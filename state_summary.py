@@ -0,0 +1,133 @@
+from metrics import END_DATE, START_DATE
+from queries import has_table, has_typed_population
+
+#
+# Materialized per-state summary. StateSummary holds one row per state with
+# the numbers the charts rank by. Triggers on CovidData and Population note
+# which states changed in SummaryChangeLog, and refresh_summary recomputes
+# only those states, so the top-N charts become an indexed
+# ORDER BY ... LIMIT instead of a Python sort over every row. The dates and
+# population year of the last refresh are kept in SummaryWindow; refreshing
+# over a different window recomputes every state.
+#
+
+#the window a new summary is built over when the caller doesn't pick one
+DEFAULT_WINDOW = (START_DATE, END_DATE, 2020)
+
+SUMMARY_COLUMNS = ['start_cases', 'end_cases', 'latest_cases', 'percent_change', 'cases_per_capita']
+
+TRIGGERS = {
+    'CovidData': [
+        ('INSERT', 'NEW.state_id'),
+        ('UPDATE', 'NEW.state_id), (OLD.state_id'),
+        ('DELETE', 'OLD.state_id'),
+    ],
+    'Population': [
+        ('INSERT', 'NEW.state_id'),
+        ('UPDATE', 'NEW.state_id), (OLD.state_id'),
+        ('DELETE', 'OLD.state_id'),
+    ],
+}
+
+REFRESH_SQL = '''
+INSERT OR REPLACE INTO StateSummary (state_id, start_cases, end_cases, latest_date, latest_cases, percent_change, cases_per_capita)
+SELECT state_id, start_cases, end_cases, latest_date, latest_cases,
+    CASE WHEN start_cases != 0 THEN (end_cases - start_cases) * 100.0 / start_cases END,
+    latest_cases * 1.0 / population
+FROM (
+    SELECT SummaryChangeLog.state_id,
+        (SELECT number_of_cases FROM CovidData JOIN Dates ON CovidData.date_id = Dates.date_id
+            WHERE CovidData.state_id = SummaryChangeLog.state_id AND Dates.date = :start_date) AS start_cases,
+        (SELECT number_of_cases FROM CovidData JOIN Dates ON CovidData.date_id = Dates.date_id
+            WHERE CovidData.state_id = SummaryChangeLog.state_id AND Dates.date = :end_date) AS end_cases,
+        (SELECT Dates.date FROM CovidData JOIN Dates ON CovidData.date_id = Dates.date_id
+            WHERE CovidData.state_id = SummaryChangeLog.state_id ORDER BY Dates.date DESC LIMIT 1) AS latest_date,
+        (SELECT number_of_cases FROM CovidData JOIN Dates ON CovidData.date_id = Dates.date_id
+            WHERE CovidData.state_id = SummaryChangeLog.state_id ORDER BY Dates.date DESC LIMIT 1) AS latest_cases,
+        {population} AS population
+    FROM SummaryChangeLog
+)
+WHERE latest_date IS NOT NULL
+'''
+
+POPULATION_LOOKUP = '(SELECT population FROM Population WHERE Population.state_id = SummaryChangeLog.state_id AND Population.year = :pop_year)'
+
+
+def create_summary_tables(cur, conn):
+    '''Takes in the cur and conn variables. Creates StateSummary, its indexes, the SummaryChangeLog table and the
+    change-tracking triggers on CovidData and Population (for whichever of the two exist, and for Population only once
+    it's in the (state_id, year) form). If anything had to be created, every state is marked as changed so the next
+    refresh_summary rebuilds the whole summary. Returns nothing.'''
+    cur.execute("SELECT name, sql FROM sqlite_master WHERE type IN ('table', 'trigger')")
+    existing = dict(cur.fetchall())
+    created = 'StateSummary' not in existing or 'SummaryChangeLog' not in existing
+
+    cur.execute('CREATE TABLE IF NOT EXISTS StateSummary ("state_id" INTEGER PRIMARY KEY, "start_cases" INTEGER, "end_cases" INTEGER, '
+                '"latest_date" TEXT, "latest_cases" INTEGER, "percent_change" REAL, "cases_per_capita" REAL)')
+    for column in SUMMARY_COLUMNS:
+        cur.execute(f'CREATE INDEX IF NOT EXISTS StateSummary_{column} ON StateSummary ({column})')
+    cur.execute('CREATE TABLE IF NOT EXISTS SummaryChangeLog ("state_id" INTEGER PRIMARY KEY)')
+    cur.execute('CREATE TABLE IF NOT EXISTS SummaryWindow ("start_date" TEXT, "end_date" TEXT, "pop_year" INTEGER)')
+
+    for table, events in TRIGGERS.items():
+        if table not in existing or (table == 'Population' and not has_typed_population(cur)):
+            continue
+        for event, state_ids in events:
+            name = f'{table}_{event.lower()}_summary'
+            if name in existing and 'ON CONFLICT DO NOTHING' in existing[name]:
+                continue
+            #an upsert's DO UPDATE overrides a trigger's OR IGNORE with its own conflict policy, ON CONFLICT DO NOTHING holds
+            cur.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cur.execute(f'CREATE TRIGGER {name} AFTER {event} ON {table} BEGIN '
+                        f'INSERT INTO SummaryChangeLog (state_id) VALUES ({state_ids}) ON CONFLICT DO NOTHING; END')
+            created = True
+
+    if created and has_table(cur, 'States'):
+        cur.execute('INSERT OR IGNORE INTO SummaryChangeLog (state_id) SELECT state_id FROM States')
+    conn.commit()
+
+
+def refresh_summary(cur, conn, start_date=None, end_date=None, pop_year=None):
+    '''This function takes in the cur and conn variables, the two YYYYMMDD dates the percent change is measured
+    between and the population year used for the per-capita rate. Any of them left as None keeps the value the
+    summary was last built with (Dec 1 2020, Mar 7 2021 and 2020 for a new summary), so only covid_data.py's
+    --start/--end move the window. It recomputes StateSummary for just the states listed in SummaryChangeLog, or
+    for every state if the window isn't the one the summary was last built for, and empties the log, in one
+    transaction. Returns the number of states refreshed.'''
+    cur.execute('SELECT start_date, end_date, pop_year FROM SummaryWindow')
+    stored = cur.fetchone()
+    last = stored or DEFAULT_WINDOW
+    window = (str(start_date) if start_date is not None else last[0], str(end_date) if end_date is not None else last[1],
+              int(pop_year) if pop_year is not None else last[2])
+    if stored != window:
+        with conn:
+            conn.execute('INSERT OR IGNORE INTO SummaryChangeLog (state_id) SELECT state_id FROM States')
+            conn.execute('DELETE FROM SummaryWindow')
+            conn.execute('INSERT INTO SummaryWindow (start_date, end_date, pop_year) VALUES (?, ?, ?)', window)
+
+    cur.execute('SELECT COUNT(*) FROM SummaryChangeLog')
+    changed = cur.fetchone()[0]
+    #with no cases loaded yet the log is kept for the first refresh that has some
+    if not changed or not (has_table(cur, 'CovidData') and has_table(cur, 'Dates')):
+        return 0
+
+    population = POPULATION_LOOKUP if has_typed_population(cur) else 'NULL'
+    params = {'start_date': window[0], 'end_date': window[1], 'pop_year': window[2]}
+    with conn:
+        conn.execute('DELETE FROM StateSummary WHERE state_id IN (SELECT state_id FROM SummaryChangeLog)')
+        conn.execute(REFRESH_SQL.format(population=population), params)
+        conn.execute('DELETE FROM SummaryChangeLog')
+    return changed
+
+
+def top_states(cur, column, n=10, descending=True):
+    '''This function takes in the cursor, one of the StateSummary columns in SUMMARY_COLUMNS, how many states
+    to return and the sort direction. Returns a list of (state, value) tuples answered from the column's index.'''
+    if column not in SUMMARY_COLUMNS:
+        raise ValueError(f"can't rank by {column}, expected one of {SUMMARY_COLUMNS}")
+    order = 'DESC' if descending else 'ASC'
+    #rank inside StateSummary first so the LIMIT is served by the column index, then look up the n names
+    cur.execute(f'SELECT States.state, top.value FROM (SELECT state_id, {column} AS value FROM StateSummary '
+                f'WHERE {column} IS NOT NULL ORDER BY {column} {order} LIMIT ?) AS top '
+                f'JOIN States ON top.state_id = States.state_id ORDER BY top.value {order}', (n,))
+    return cur.fetchall()
@@ -0,0 +1,118 @@
+import csv
+
+#
+# Region registry. The States table holds one row per region, with its
+# lowercase abbreviation (the key the COVID Tracking API uses), the full
+# name used on the Wikipedia population page and its FIPS code. Every
+# script reads the set of regions from there, so adding DC, the territories
+# or a few thousand counties is a matter of adding rows. Population pages
+# are matched to regions by name, so names have to be unique: counties
+# need their state in the name, like "Washington County, Oregon".
+#
+
+STATES = [
+    ('al', 'Alabama', '01'), ('ak', 'Alaska', '02'), ('az', 'Arizona', '04'), ('ar', 'Arkansas', '05'), ('ca', 'California', '06'),
+    ('co', 'Colorado', '08'), ('ct', 'Connecticut', '09'), ('de', 'Delaware', '10'), ('fl', 'Florida', '12'), ('ga', 'Georgia', '13'),
+    ('hi', 'Hawaii', '15'), ('id', 'Idaho', '16'), ('il', 'Illinois', '17'), ('in', 'Indiana', '18'), ('ia', 'Iowa', '19'),
+    ('ks', 'Kansas', '20'), ('ky', 'Kentucky', '21'), ('la', 'Louisiana', '22'), ('me', 'Maine', '23'), ('md', 'Maryland', '24'),
+    ('ma', 'Massachusetts', '25'), ('mi', 'Michigan', '26'), ('mn', 'Minnesota', '27'), ('ms', 'Mississippi', '28'), ('mo', 'Missouri', '29'),
+    ('mt', 'Montana', '30'), ('ne', 'Nebraska', '31'), ('nv', 'Nevada', '32'), ('nh', 'New Hampshire', '33'), ('nj', 'New Jersey', '34'),
+    ('nm', 'New Mexico', '35'), ('ny', 'New York', '36'), ('nc', 'North Carolina', '37'), ('nd', 'North Dakota', '38'), ('oh', 'Ohio', '39'),
+    ('ok', 'Oklahoma', '40'), ('or', 'Oregon', '41'), ('pa', 'Pennsylvania', '42'), ('ri', 'Rhode Island', '44'), ('sc', 'South Carolina', '45'),
+    ('sd', 'South Dakota', '46'), ('tn', 'Tennessee', '47'), ('tx', 'Texas', '48'), ('ut', 'Utah', '49'), ('vt', 'Vermont', '50'),
+    ('va', 'Virginia', '51'), ('wa', 'Washington', '53'), ('wv', 'West Virginia', '54'), ('wi', 'Wisconsin', '55'), ('wy', 'Wyoming', '56'),
+]
+
+OTHER_REGIONS = [
+    ('dc', 'District of Columbia', '11'), ('pr', 'Puerto Rico', '72'), ('gu', 'Guam', '66'),
+    ('vi', 'U.S. Virgin Islands', '78'), ('as', 'American Samoa', '60'), ('mp', 'Northern Mariana Islands', '69'),
+]
+
+REGION_SETS = {'states': STATES, 'all': STATES + OTHER_REGIONS}
+
+# lowercase abbreviation -> full name of the 50 states, in the same order as the States table
+STATE_NAMES = {abbreviation: name for abbreviation, name, fips in STATES}
+
+
+def create_region_table(cur, conn):
+    '''Takes in the cur and conn variables. Creates the States registry if it doesn't exist, adds the name and fips
+    columns to a States table from before the registry, and indexes abbreviation (unique), name and FIPS code.
+    Returns nothing.'''
+    cur.execute('CREATE TABLE IF NOT EXISTS States ("state_id" INTEGER PRIMARY KEY, "state" TEXT, "name" TEXT, "fips" TEXT)')
+    cur.execute('PRAGMA table_info(States)')
+    columns = [row[1] for row in cur.fetchall()]
+    for column in ('name', 'fips'):
+        if column not in columns:
+            cur.execute(f'ALTER TABLE States ADD COLUMN "{column}" TEXT')
+    cur.execute('CREATE UNIQUE INDEX IF NOT EXISTS States_state_unique ON States (state)')
+    cur.execute('CREATE INDEX IF NOT EXISTS States_name ON States (name)')
+    cur.execute('CREATE INDEX IF NOT EXISTS States_fips ON States (fips)')
+    conn.commit()
+
+
+def duplicate_names(names):
+    '''Takes in a dictionary with abbreviation as key and full name as value. Returns the sorted list of names
+    that more than one region has.'''
+    seen = set()
+    duplicates = set()
+    for name in names.values():
+        if name in seen:
+            duplicates.add(name)
+        seen.add(name)
+    return sorted(duplicates)
+
+
+def add_regions(cur, conn, regions):
+    '''Takes in the cur and conn variables and a list of (abbreviation, name, fips) regions. Adds the regions that
+    aren't registered yet and updates the name and FIPS code of those that are, in one transaction. Raises
+    ValueError without changing anything if two regions would end up with the same name. Returns nothing.'''
+    names = region_names(cur)
+    names.update((abbreviation.lower(), name) for abbreviation, name, fips in regions if name)
+    duplicates = duplicate_names(names)
+    if duplicates:
+        raise ValueError(f"{len(duplicates)} region names are used more than once, e.g. {duplicates[:3]}; "
+                         "population is matched by name, so qualify them (\"Washington County, Oregon\")")
+    cur.executemany('INSERT INTO States (state, name, fips) VALUES (?, ?, ?) '
+                    'ON CONFLICT (state) DO UPDATE SET name = excluded.name, fips = excluded.fips',
+                    [(abbreviation.lower(), name, fips) for abbreviation, name, fips in regions])
+    conn.commit()
+
+
+def read_regions(path):
+    '''Reads a csv file with abbreviation, name and fips columns (and a header row). Returns a list of
+    (abbreviation, name, fips) tuples.'''
+    with open(path, newline='') as f:
+        rows = csv.DictReader(f)
+        return [(row['abbreviation'].strip().lower(), row['name'].strip(), row['fips'].strip()) for row in rows]
+
+
+def regions_for(spec):
+    '''Returns the list of regions for 'states', 'all' (the states, DC and the territories) or the path of a csv
+    file in the format read_regions expects.'''
+    if spec in REGION_SETS:
+        return REGION_SETS[spec]
+    return read_regions(spec)
+
+
+def region_list(cur):
+    '''Returns the abbreviations of every registered region, in state_id order.'''
+    cur.execute('SELECT state FROM States ORDER BY state_id')
+    return [row[0] for row in cur.fetchall()]
+
+
+def region_names(cur):
+    '''Returns a dictionary with abbreviation as key and full name as value, for the regions that have a name.'''
+    cur.execute('SELECT state, name FROM States WHERE name IS NOT NULL ORDER BY state_id')
+    return dict(cur.fetchall())
+
+
+def region_ids_by_name(cur):
+    '''Returns a dictionary with full name as key and state_id as value. Raises ValueError if two regions share a
+    name (possible in a registry filled before add_regions checked), since population rows would be merged.'''
+    cur.execute('SELECT name, state_id FROM States WHERE name IS NOT NULL')
+    rows = cur.fetchall()
+    ids = dict(rows)
+    if len(ids) != len(rows):
+        duplicates = duplicate_names(dict((state_id, name) for name, state_id in rows))
+        raise ValueError(f"region names are used more than once, e.g. {duplicates[:3]}")
+    return ids
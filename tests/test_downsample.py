@@ -0,0 +1,40 @@
+import math
+
+from downsample import bucket_bounds, lttb
+
+#
+# LTTB on generated series: how many points come back, which ones are always
+# kept, and that bucket_bounds splits the points the way LTTB does.
+#
+
+SIZES = [(3, 3), (10, 3), (10, 4), (100, 7), (1000, 10), (1001, 10), (997, 33), (5000, 1000)]
+
+
+def wave(count):
+    return lambda: ((x, math.sin(x / 7) * 100 + x % 13) for x in range(count))
+
+
+def test_bucket_bounds_matches_lttb_split():
+    for count, threshold in SIZES:
+        buckets = threshold - 2
+        every = (count - 2) / buckets
+        bucket_of = bucket_bounds(count, buckets)
+        for b in range(buckets):
+            start = int(b * every) + 1
+            end = int((b + 1) * every) + 1 if b + 1 < buckets else count - 1
+            assert [bucket_of(i) for i in range(start, end)] == [b] * (end - start)
+
+
+def test_exact_length_and_ends_kept():
+    for count, threshold in SIZES:
+        points = list(wave(count)())
+        kept = lttb(wave(count), count, threshold)
+        assert len(kept) == threshold
+        assert kept[0] == points[0]
+        assert kept[-1] == points[-1]
+        assert [point[0] for point in kept] == sorted(set(point[0] for point in kept))
+
+
+def test_short_series_returned_whole():
+    for count, threshold in [(0, 10), (1, 10), (2, 10), (10, 10), (9, 10)]:
+        assert lttb(wave(count), count, threshold) == list(wave(count)())
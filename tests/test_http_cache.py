@@ -0,0 +1,81 @@
+import gzip
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from fetcher import make_session
+from http_cache import CacheMiss, HttpCache
+from json_stream import iter_json_array
+
+#
+# Streamed fetches through the cache against a local server that sends
+# daily.json gzip encoded, so Content-Length is the compressed size.
+#
+
+RECORDS = [{'date': 20210307 - i, 'positive': random.Random(i).randrange(10 ** 9)} for i in range(20000)]
+BODY = gzip.compress(json.dumps(RECORDS).encode())
+
+
+class GzipHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.send_header('ETag', '"daily"')
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GzipHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/v1/states/ca/daily.json'
+    server.shutdown()
+
+
+def read_all(chunks):
+    return list(iter_json_array(chunks))
+
+
+def read_first(chunks):
+    return next(iter(iter_json_array(chunks)))
+
+
+def test_full_gzip_read_is_cached(url, tmp_path):
+    session = make_session(1)
+    cache = HttpCache(str(tmp_path / 'cache.db'))
+    assert cache.get_streamed(session, url, read_all) == RECORDS
+    assert cache.stats['misses'] == 1 and cache.stats['partial'] == 0
+    cache.close()
+
+    offline = HttpCache(str(tmp_path / 'cache.db'), offline=True)
+    assert offline.get_streamed(session, url, read_all) == RECORDS
+    assert offline.stats['hits'] == 1
+    offline.close()
+    session.close()
+
+
+def test_early_stop_is_not_cached(url, tmp_path):
+    session = make_session(1)
+    cache = HttpCache(str(tmp_path / 'cache.db'))
+    assert cache.get_streamed(session, url, read_first) == RECORDS[0]
+    assert cache.stats['partial'] == 1
+    assert cache.stats['bytes_downloaded'] < len(json.dumps(RECORDS))
+    cache.close()
+
+    offline = HttpCache(str(tmp_path / 'cache.db'), offline=True)
+    with pytest.raises(CacheMiss):
+        offline.get_streamed(session, url, read_first)
+    offline.close()
+    session.close()
@@ -0,0 +1,54 @@
+import sqlite3
+
+import pytest
+
+from covid_data import COVID_INSERT
+from ingest_scheduler import create_checkpoint_table, run_ingest
+
+#
+# An ingest where some units of a batch fail to fetch, run again: the second
+# run should only fetch what the first left pending and insert nothing twice.
+#
+
+STATES = ['AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT']
+DATES = [20201201, 20210301]
+UNITS = [(state, date) for date in DATES for state in STATES]
+
+
+@pytest.fixture
+def db():
+    conn = sqlite3.connect(':memory:')
+    cur = conn.cursor()
+    cur.execute('CREATE TABLE CovidData ("id" INTEGER PRIMARY KEY, "state_id" NUMBER, "date_id" NUMBER, "number_of_cases" NUMBER)')
+    create_checkpoint_table(cur, conn)
+    yield cur, conn
+    conn.close()
+
+
+def fetcher(failing, requested):
+    '''Returns a fetch_batch function that leaves out the units in failing and records every unit it was asked for.'''
+    def fetch_batch(batch):
+        requested.extend(batch)
+        return [(unit, (STATES.index(unit[0]) + 1, DATES.index(unit[1]) + 1, 1000 + len(requested)))
+                for unit in batch if unit not in failing]
+    return fetch_batch
+
+
+def test_rerun_fetches_only_pending_units(db):
+    cur, conn = db
+    failing = {('AZ', 20201201), ('CT', 20201201), ('AL', 20210301)}
+
+    requested = []
+    assert run_ingest(cur, conn, 'covid', UNITS, fetcher(failing, requested), COVID_INSERT, batch_size=4) == len(failing)
+    assert requested == UNITS
+
+    requested = []
+    assert run_ingest(cur, conn, 'covid', UNITS, fetcher(set(), requested), COVID_INSERT, batch_size=4) == 0
+    assert requested == [unit for unit in UNITS if unit in failing]
+
+    requested = []
+    assert run_ingest(cur, conn, 'covid', UNITS, fetcher(set(), requested), COVID_INSERT, batch_size=4) == 0
+    assert requested == []
+
+    cur.execute("SELECT COUNT(*), COUNT(DISTINCT state_id || '-' || date_id) FROM CovidData")
+    assert cur.fetchone() == (len(UNITS), len(UNITS))
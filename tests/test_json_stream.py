@@ -0,0 +1,17 @@
+import json
+
+from json_stream import iter_json_array
+
+DOCUMENT = '[1, 2.5, -3e2, 4.25E-1, {"date": 20201201, "positive": 10}, [5, 6], "seven", true, null, 80]'
+
+
+def test_every_chunk_boundary():
+    expected = json.loads(DOCUMENT)
+    data = DOCUMENT.encode()
+    for split in range(1, len(data)):
+        assert list(iter_json_array([data[:split], data[split:]])) == expected
+
+
+def test_one_byte_chunks():
+    data = DOCUMENT.encode()
+    assert list(iter_json_array(data[i:i + 1] for i in range(len(data)))) == json.loads(DOCUMENT)
@@ -0,0 +1,90 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import covid_data as cd
+import population_data as pdm
+from population_snapshots import create_snapshot_table, ingest_snapshots
+from state_summary import create_summary_tables
+
+#
+# Loads a saved copy of the population page, then loads it again unchanged
+# and again with one figure edited, like re-runs of population_data.py.
+#
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'population.html')
+
+
+@pytest.fixture
+def db():
+    conn = sqlite3.connect(':memory:')
+    cur = conn.cursor()
+    cd.state_table(cur, conn)
+    pdm.create_population_table(cur, conn)
+    create_summary_tables(cur, conn)
+    create_snapshot_table(cur, conn)
+    cur.execute('DELETE FROM SummaryChangeLog')
+    conn.commit()
+    yield cur, conn
+    conn.close()
+
+
+def population(cur, name, year):
+    cur.execute('SELECT population FROM Population JOIN States ON Population.state_id = States.state_id '
+                'WHERE States.name = ? AND year = ?', (name, year))
+    return cur.fetchone()[0]
+
+
+def test_load_unchanged_and_changed_reruns(db, tmp_path):
+    cur, conn = db
+    page = str(tmp_path / 'population.html')
+    shutil.copy(FIXTURE, page)
+    ids = pdm.state_ids_by_name(cur)
+
+    first = ingest_snapshots(cur, conn, [page], ids, workers=1)
+    assert first == {'loaded': 1, 'skipped': 0, 'failed': 0, 'rows': 9}
+    assert population(cur, 'California', 2020) == 39538223
+    assert population(cur, 'Florida', 2010) == 18801310
+    #a column headed only "July 1, 2023 estimate" counts as a population column too
+    assert population(cur, 'Texas', 2023) == 30503301
+
+    again = ingest_snapshots(cur, conn, [page], ids, workers=1)
+    assert again == {'loaded': 0, 'skipped': 1, 'failed': 0, 'rows': 0}
+
+    cur.execute('DELETE FROM SummaryChangeLog')
+    conn.commit()
+    with open(page) as f:
+        text = f.read()
+    with open(page, 'w') as f:
+        f.write(text.replace('29,145,505', '29,145,600'))
+
+    changed = ingest_snapshots(cur, conn, [page], ids, workers=1)
+    assert changed == {'loaded': 1, 'skipped': 0, 'failed': 0, 'rows': 1}
+    assert population(cur, 'Texas', 2020) == 29145600
+    assert population(cur, 'Texas', 2010) == 25145561
+    cur.execute('SELECT States.name FROM SummaryChangeLog JOIN States ON SummaryChangeLog.state_id = States.state_id')
+    assert cur.fetchall() == [('Texas',)]
+
+
+def test_later_source_wins_when_only_an_earlier_one_changed(db, tmp_path):
+    cur, conn = db
+    with open(FIXTURE) as f:
+        text = f.read()
+    earlier = str(tmp_path / 'earlier.html')
+    later = str(tmp_path / 'later.html')
+    with open(earlier, 'w') as f:
+        f.write(text)
+    with open(later, 'w') as f:
+        f.write(text.replace('39,538,223', '39,538,300'))
+    ids = pdm.state_ids_by_name(cur)
+
+    ingest_snapshots(cur, conn, [earlier, later], ids, workers=1)
+    assert population(cur, 'California', 2020) == 39538300
+
+    with open(earlier, 'w') as f:
+        f.write(text.replace('39,538,223', '39,538,250'))
+    result = ingest_snapshots(cur, conn, [earlier, later], ids, workers=1)
+    assert result['loaded'] == 2
+    assert population(cur, 'California', 2020) == 39538300
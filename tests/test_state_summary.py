@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+
+import covid_data as cd
+from metrics import END_DATE, START_DATE
+from state_summary import create_summary_tables, refresh_summary, top_states
+
+#
+# Builds StateSummary over a few days of cases, then edits one state's row
+# like a re-ingest would: only that state should be recomputed, and the
+# top-N answers should show the new number.
+#
+
+LATER_DATE = '20210308'
+
+
+@pytest.fixture
+def db():
+    conn = sqlite3.connect(':memory:')
+    cur = conn.cursor()
+    cd.state_table(cur, conn)
+    cd.date_table(cur, conn)
+    cd.add_dates(cur, conn, [LATER_DATE])
+    cd.create_covid_tables(cur, conn)
+    rows = []
+    for state_id, date_id in cur.execute('SELECT state_id, date_id FROM States, Dates').fetchall():
+        rows.append((state_id, date_id, state_id * 1000 + date_id))
+    cur.executemany(cd.COVID_INSERT, rows)
+    create_summary_tables(cur, conn)
+    refresh_summary(cur, conn, START_DATE, END_DATE)
+    yield cur, conn
+    conn.close()
+
+
+def summary(cur):
+    cur.execute('SELECT * FROM StateSummary ORDER BY state_id')
+    return cur.fetchall()
+
+
+def test_only_the_changed_state_is_refreshed(db):
+    cur, conn = db
+    before = summary(cur)
+    assert len(before) == 50
+    assert top_states(cur, 'latest_cases', 1) == [('wy', 50003)]
+
+    cur.execute("SELECT state_id FROM States WHERE state = 'de'")
+    delaware = cur.fetchone()[0]
+    cur.execute('UPDATE CovidData SET number_of_cases = 99999 WHERE state_id = ? AND date_id = '
+                '(SELECT date_id FROM Dates WHERE date = ?)', (delaware, LATER_DATE))
+    conn.commit()
+
+    cur.execute('SELECT state_id FROM SummaryChangeLog')
+    assert cur.fetchall() == [(delaware,)]
+    assert refresh_summary(cur, conn) == 1
+
+    after = summary(cur)
+    assert [row for row in after if row[0] != delaware] == [row for row in before if row[0] != delaware]
+    assert top_states(cur, 'latest_cases', 2) == [('de', 99999), ('wy', 50003)]
+    assert refresh_summary(cur, conn) == 0
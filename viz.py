@@ -1,32 +1,30 @@
-import requests
-import sqlite3
-import json
 import os
-from bs4 import BeautifulSoup
-import matplotlib.pyplot as plt
-import csv
-
-def setUpDatabase(db_name):
-    '''This function takes in the name of the database, makes a connection to server
-    using name given, and returns cur and conn as the cursor and connection variable
-    to allow database access.'''
-    
-    path = os.path.dirname(os.path.abspath(__file__))
-    conn = sqlite3.connect(path+'/'+db_name)
-    cur = conn.cursor()
-    return cur, conn
-
-def cases_percent_change(cur, conn):
-    '''This function takes in the cursor and connection variables. It uses matplotlib to create a bar graph
-    of the 10 states with highest % increase in COVID cases from Dec 2020 to Mar 2021 by using the PercentChange table.
-    Output is the creation of the graph.'''
-    percent_list = []
-    cur.execute('SELECT States.state, PercentChange.percent_change FROM PercentChange JOIN States ON PercentChange.state_id = States.state_id')
-    for row in cur:
-        percent_list.append(row)
-    percent_list = sorted(percent_list, key = lambda x: x[1], reverse=True)
-
-    top_ten = percent_list[:10]
+import argparse
+import instrument
+import time
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+from analytic_cache import MISSING, get_cache
+from state_summary import top_states
+from db import setUpDatabase
+from downsample import lttb
+from metrics import END_DATE, METRIC_COLUMNS, START_DATE, compute_metrics, top_regions
+from queries import count_cases_for_state, iter_cases_for_state
+
+#matplotlib.pyplot is imported inside the functions that draw, so the data functions don't pay for it
+#the top-n bar charts are answered from the StateSummary table the ingest scripts keep up to date, the
+#population and metrics charts from the process's analytic cache, so those tables are only queried once per change
+
+#slices past this many are folded into one "Other" slice, so the pie stays readable with thousands of regions
+MAX_SLICES = 60
+#points per line in the time series chart, about one per pixel across a saved figure
+DISPLAY_POINTS = 800
+
+@instrument.timed('cases_percent_change_data')
+def cases_percent_change_data(cur):
+    '''Takes in the cursor. Returns the state labels and percent changes of the 10 states with the highest
+    % increase in COVID cases from Dec 2020 to Mar 2021, from the StateSummary table.'''
+    top_ten = top_states(cur, 'percent_change', 10)
 
     x = []
     y = []
@@ -35,6 +33,13 @@ def cases_percent_change(cur, conn):
         x.append(item[0])
         y.append(item[1])
 
+    return x, y
+
+@instrument.timed('draw_cases_percent_change')
+def draw_cases_percent_change(data):
+    '''Draws the bar graph for cases_percent_change from the (labels, values) returned by cases_percent_change_data.'''
+    import matplotlib.pyplot as plt
+    x, y = data
     x_pos = [i for i, _ in enumerate(x)]
 
     plt.bar(x_pos, y, color='green')
@@ -44,28 +49,35 @@ def cases_percent_change(cur, conn):
 
     plt.xticks(x_pos, x)
 
-    plt.show()
-
-def highest_positives_viz(cur, conn):
+@instrument.timed('cases_percent_change')
+def cases_percent_change(cur, conn):
     '''This function takes in the cursor and connection variables. It uses matplotlib to create a bar graph
-    of the 10 states with highest # of COVID cases on Dec 1 2020 by using the CovidData table.
+    of the 10 states with highest % increase in COVID cases from Dec 2020 to Mar 2021 by using the StateSummary table.
     Output is the creation of the graph.'''
-    positives_list = []
-    cur.execute('SELECT States.state, Dates.date, CovidData.number_of_cases FROM CovidData JOIN States JOIN Dates ON CovidData.state_id = States.state_id and CovidData.date_id = Dates.date_id')
-    for row in cur:
-        if row[1] == '20201201':
-            positives_list.append(row)
-    positives_list = sorted(positives_list, key = lambda x: x[2], reverse=True)
+    import matplotlib.pyplot as plt
+    draw_cases_percent_change(cases_percent_change_data(cur))
+    plt.show()
 
-    top_ten = positives_list[:10]
+@instrument.timed('highest_positives_data')
+def highest_positives_data(cur):
+    '''Takes in the cursor. Returns the state labels and case counts of the 10 states with the highest # of
+    COVID cases on Dec 1 2020, from the StateSummary table.'''
+    top_ten = top_states(cur, 'start_cases', 10)
 
     x = []
     y = []
 
     for item in top_ten:
         x.append(item[0])
-        y.append(item[2])
+        y.append(item[1])
+
+    return x, y
 
+@instrument.timed('draw_highest_positives')
+def draw_highest_positives(data):
+    '''Draws the bar graph for highest_positives_viz from the (labels, values) returned by highest_positives_data.'''
+    import matplotlib.pyplot as plt
+    x, y = data
     x_pos = [i for i, _ in enumerate(x)]
 
     plt.bar(x_pos, y, color='blue')
@@ -75,25 +87,47 @@ def highest_positives_viz(cur, conn):
 
     plt.xticks(x_pos, x)
 
+@instrument.timed('highest_positives_viz')
+def highest_positives_viz(cur, conn):
+    '''This function takes in the cursor and connection variables. It uses matplotlib to create a bar graph
+    of the 10 states with highest # of COVID cases on Dec 1 2020 by using the StateSummary table.
+    Output is the creation of the graph.'''
+    import matplotlib.pyplot as plt
+    draw_highest_positives(highest_positives_data(cur))
     plt.show()
 
-def pop_chart(cur, conn):
-    """This function takes in the cursor and connection variables. It uses matplotlib to create a pie chart of the 50 United States and their 2020 population numbers to create the division of the 2020 total US Population per state population. Output is the creation of the pie chart."""
-    
-    # Pie chart, where the slices will be ordered and plotted counter-clockwise:
-
+@instrument.timed('pop_chart_data')
+def pop_chart_data(cur):
+    """Takes in the cursor. Returns the region names and their 2020 population numbers, biggest first."""
     label = []
     population = []
 
-    # Grabbing Populations and States from the Database
-    cursor = cur.execute("SELECT state, population FROM Population")
-    for row in cursor:
-        if row[0].split(":")[1] == "2020":
-            label.append(row[0].split(":")[0])
-            num = row[1]
-            num = int(num.replace(',', ''))
-            population.append(num)
+    # 2020 Populations from the cache, biggest first so the labelled slices are the big ones
+    cache = get_cache(cur)
+    populations = cache.population(2020)
+    top = cache.top(populations, MAX_SLICES)
+    if len(top) == MAX_SLICES:
+        top = top[:-1]
+    for state, pop in top:
+        i = cache.state_index[state]
+        label.append(cache.names[i] or state)
+        population.append(pop)
+
+    # Everything after the biggest slices is summed as it's streamed instead of getting a slice of its own
+    rest = sum(value for value in populations if value != MISSING) - sum(population)
+    if rest > 0:
+        label.append("Other")
+        population.append(rest)
+
+    return label, population
+
+@instrument.timed('draw_pop_chart')
+def draw_pop_chart(data):
+    """Draws the pie chart for pop_chart from the (labels, populations) returned by pop_chart_data."""
+    import matplotlib.pyplot as plt
+    label, population = data
 
+    # Pie chart, where the slices will be ordered and plotted counter-clockwise:
     clearLabels = label[:8]
     for x in label[8:]:
         clearLabels.append("")
@@ -103,37 +137,24 @@ def pop_chart(cur, conn):
     ax1.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
     plt.title("Total 2020 US Population by State")
 
+@instrument.timed('pop_chart')
+def pop_chart(cur, conn):
+    """This function takes in the cursor and connection variables. It uses matplotlib to create a pie chart of the 50 United States and their 2020 population numbers to create the division of the 2020 total US Population per state population. Output is the creation of the pie chart."""
+    import matplotlib.pyplot as plt
+    draw_pop_chart(pop_chart_data(cur))
     plt.show()
 
-def comparison_chart(cur, conn):
-    '''This function takes in the cursor and connection variables. It uses matplotlib to create a bar graph
-    of the 10 states with highest # of COVID cases on Dec 1 2020, exhibited as a percentage of their overall population.
-    Output is the creation of the graph.'''
-    states_list = ['ca', 'tx', 'fl', 'ny', 'il', 'ga', 'oh', 'wi', 'mi', 'tn']
-    pop_use_list = ['California:2020', 'Texas:2020', 'Florida:2020', 'New York:2020', 'Illinois:2020', 'Georgia:2020', 'Ohio:2020', 'Wisconsin:2020', 'Michigan:2020', 'Tennessee:2020']
-    cases_list = []
-    pop_list = []
+@instrument.timed('comparison_chart_data')
+def comparison_chart_data(cur, n=10):
+    '''Takes in the cursor and how many regions to show. Returns the region labels and the share of the population
+    testing positive on Dec 1 2020 for the n regions with the highest # of cases, most cases first.'''
     percent_list = []
     
-    cur.execute('SELECT States.state, Dates.date, CovidData.number_of_cases FROM CovidData JOIN States JOIN Dates ON CovidData.state_id = States.state_id and CovidData.date_id = Dates.date_id')
-    for row in cur:
-        for state in states_list:
-            if row[1] == '20201201' and row[0] == state:
-                cases_list.append(row)
-    cases_list = sorted(cases_list, key = lambda x: x[0])
-
-    cur.execute('SELECT Population.state, Population.population FROM Population')
-    for row in cur:
-        for state in pop_use_list:
-            if row[0] == state:
-                pop_list.append(row)
-    pop_list = sorted(pop_list, key = lambda x: x[0])
-
-    for i in range(10):
-        cases = cases_list[i][2]
-        pop = pop_list[i][1]
-        value = cases / int(pop.replace(',' , ''))
-        tup = (cases_list[i][0], value, cases)
+    # Cases per 100k from the metrics engine, which joins cases to population by state_id, kept until the data changes
+    rows = get_cache(cur).remember(('metrics', START_DATE, END_DATE), lambda: compute_metrics(cur, START_DATE, END_DATE))
+    per_100k = METRIC_COLUMNS.index('start_cases_per_100k')
+    for row in top_regions([row for row in rows if row[per_100k] is not None], 'start_cases', n):
+        tup = (row[0], row[per_100k] / 100000, row[2])
         percent_list.append(tup)
     
     percent_list = sorted(percent_list, key = lambda x: x[2], reverse = True)
@@ -145,6 +166,13 @@ def comparison_chart(cur, conn):
         x.append(item[0])
         y.append(item[1])
 
+    return x, y
+
+@instrument.timed('draw_comparison_chart')
+def draw_comparison_chart(data):
+    '''Draws the bar graph for comparison_chart from the (labels, values) returned by comparison_chart_data.'''
+    import matplotlib.pyplot as plt
+    x, y = data
     x_pos = [i for i, _ in enumerate(x)]
 
     plt.bar(x_pos, y, color='black')
@@ -154,15 +182,140 @@ def comparison_chart(cur, conn):
 
     plt.xticks(x_pos, x)
 
+@instrument.timed('comparison_chart')
+def comparison_chart(cur, conn):
+    '''This function takes in the cursor and connection variables. It uses matplotlib to create a bar graph
+    of the 10 states with highest # of COVID cases on Dec 1 2020, exhibited as a percentage of their overall population.
+    Output is the creation of the graph.'''
+    import matplotlib.pyplot as plt
+    draw_comparison_chart(comparison_chart_data(cur))
+    plt.show()
+
+def to_ordinal(date):
+    '''Turns a YYYYMMDD date into a day number, so dates can be used as x values.'''
+    date = int(date)
+    return datetime.date(date // 10000, date // 100 % 100, date % 100).toordinal()
+
+@instrument.timed('case_series_data')
+def case_series_data(cur, n=5, points=DISPLAY_POINTS):
+    '''Takes in the cursor, how many regions to show and how many points to keep per line. Returns the labels of
+    the n regions with the most cases on their latest stored date (from the StateSummary table) and, for each, its
+    cases over time as a pair of (day numbers, cases) lists, downsampled with LTTB. Each region's rows are streamed
+    off the cursor twice instead of fetched, so the memory used doesn't depend on how long the series is. Everything
+    is read in one read transaction.'''
+    labels = []
+    series = []
+
+    #the count and both LTTB passes have to see the same rows, so an ingest committing meanwhile waits for the next call
+    conn = cur.connection
+    started = not conn.in_transaction
+    if started:
+        cur.execute('BEGIN')
+    try:
+        for state, cases in top_states(cur, 'latest_cases', n):
+            count = count_cases_for_state(cur, state)
+            make_points = lambda state=state: ((to_ordinal(date), cases) for _, date, cases in iter_cases_for_state(cur, state) if cases is not None)
+            kept = lttb(make_points, count, points)
+            labels.append(state)
+            series.append(([point[0] for point in kept], [point[1] for point in kept]))
+    finally:
+        if started:
+            conn.commit()
+    return labels, series
+
+@instrument.timed('draw_case_series')
+def draw_case_series(data):
+    '''Draws the line chart for case_series from the (labels, series) returned by case_series_data.'''
+    import matplotlib.pyplot as plt
+    labels, series = data
+
+    for label, (days, cases) in zip(labels, series):
+        plt.plot([datetime.date.fromordinal(day) for day in days], cases, label=label)
+    plt.xlabel('Date')
+    plt.ylabel('Positive Cases')
+    plt.title('Positive cases over time for the states with the most cases')
+    plt.legend()
+
+@instrument.timed('case_series')
+def case_series(cur, conn):
+    '''This function takes in the cursor and connection variables. It uses matplotlib to create a line graph of
+    positive cases over time for the 5 states with the most cases, from the daily series in CovidData.
+    Output is the creation of the graph.'''
+    import matplotlib.pyplot as plt
+    draw_case_series(case_series_data(cur))
     plt.show()
 
-def main():
-    '''Establishes connection to server and creates visualizations.'''
-    cur, conn = setUpDatabase("finalProject.db")
+# chart name -> (query function, draw function)
+CHARTS = {
+    'cases_percent_change': (cases_percent_change_data, draw_cases_percent_change),
+    'highest_positives_viz': (highest_positives_data, draw_highest_positives),
+    'pop_chart': (pop_chart_data, draw_pop_chart),
+    'comparison_chart': (comparison_chart_data, draw_comparison_chart),
+    'case_series': (case_series_data, draw_case_series),
+}
+
+def render_chart(name, data, out_dir, formats):
+    '''Worker for render_all. Draws one chart from its already queried data with the non-interactive Agg
+    backend and saves it as out_dir/name.format for every format. Returns the chart name, the paths written
+    and the render time in seconds.'''
+    import matplotlib.pyplot as plt
+    start = time.perf_counter()
+    plt.switch_backend('Agg')
+    plt.figure()
+    CHARTS[name][1](data)
+
+    paths = []
+    for fmt in formats:
+        path = os.path.join(out_dir, f"{name}.{fmt}")
+        plt.savefig(path, bbox_inches='tight')
+        paths.append(path)
+    plt.close('all')
+    return name, paths, time.perf_counter() - start
+
+def render_all(cur, out_dir, formats=('png', 'svg'), workers=4):
+    '''This function takes in the cursor, an output directory, the image formats and the number of worker processes.
+    It runs every chart's query once up front, then renders the charts in parallel worker processes without ever
+    opening a window, and prints the query and render time of each chart. Returns a dictionary with chart name
+    as key and the list of files written as value.'''
+    os.makedirs(out_dir, exist_ok=True)
+
+    chart_data = {}
+    for name, (query, draw) in CHARTS.items():
+        start = time.perf_counter()
+        chart_data[name] = query(cur)
+        print(f"{name:<24} query  {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    written = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = [pool.submit(render_chart, name, data, out_dir, formats) for name, data in chart_data.items()]
+        for job in jobs:
+            name, paths, seconds = job.result()
+            instrument.add_time(f'render.{name}', seconds)
+            written[name] = paths
+            print(f"{name:<24} render {seconds * 1000:8.1f} ms -> {', '.join(paths)}")
+    return written
+
+def main(headless=False, out_dir='charts', formats=('png', 'svg'), workers=4):
+    '''Establishes connection to server and creates visualizations, either one window at a time or, with
+    headless=True, as image files in out_dir.'''
+    cur, conn = setUpDatabase("finalProject.db", readonly=True)
+    if headless:
+        render_all(cur, out_dir, formats, workers)
+        return
     cases_percent_change(cur, conn)
     highest_positives_viz(cur, conn)
     pop_chart(cur, conn)
     comparison_chart(cur, conn)
+    case_series(cur, conn)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Draw the project charts from finalProject.db')
+    parser.add_argument('--headless', action='store_true', help='save the charts to files instead of showing them')
+    parser.add_argument('--out', default='charts', help='directory for --headless output')
+    parser.add_argument('--format', nargs='+', default=['png', 'svg'], help='image formats for --headless output')
+    parser.add_argument('--workers', type=int, default=4, help='render processes for --headless output')
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    report_path = instrument.start_from_args(args)
+    main(args.headless, args.out, args.format, args.workers)
+    instrument.finish_from_args(report_path)